@@ -0,0 +1,295 @@
+# arrays.py
+# author antifin 2011
+# license WTFPLv2
+#
+# NumPy-backed storage for numerous homogeneous entities: stars and bullets.
+# Positions and velocities live in contiguous arrays and are updated all at once.
+# Tempers of enemy formations can be updated all at once as well.
+# NumPy is optional: check is_available() before use.
+
+import random
+
+import pygame
+
+try:
+	import numpy
+	import pygame.surfarray
+except ImportError:
+	numpy = None
+
+from defs import *
+import sprites
+import controller
+
+def is_available():
+	return numpy is not None
+
+def get_opaque_pixels(sprite):
+	""" Returns list of (x, y, color) of pixels of _sprite_ which are drawn when it is blitted. """
+	mask = pygame.mask.from_surface(sprite)
+	width, height = sprite.get_size()
+	return [(x, y, tuple(sprite.get_at((x, y)))[:3]) for y in xrange(height) for x in xrange(width) if mask.get_at((x, y))]
+
+class ArrayBackground:
+	""" Same as level.Background, but keeps stars in arrays, moves and draws them all at once.
+	Stars are drawn right into screen pixels, so it is drawn as a full frame (see Painter.draw_background). """
+
+	def __init__(self, size, count, rng=random):
+		""" Creates a background for screen with _size_ and fills it with _count_ of stars.
+		Own NumPy RNG is seeded from _rng_ (random module itself or random.Random). """
+		self.width, self.height = size
+		self.rng = numpy.random.RandomState(rng.randrange(2 ** 32))
+		self.xs = self.rng.randint(0, self.width, count).astype(float)
+		self.ys = self.rng.randint(0, self.height, count).astype(float)
+		self.patterns = self.rng.randint(0, 2, count) == 0
+		# Pattern -> (sprite, its opaque pixels), sprites are replaced when display format is known (see sprites.use_display_format).
+		self.pattern_pixels = {}
+
+	def get_pattern_pixels(self, pattern):
+		""" Returns arrays (x, y, color) of opaque pixels of the sprite of _pattern_. """
+		sprite = sprites.DIGIT_SPRITE[pattern]
+		if pattern not in self.pattern_pixels or self.pattern_pixels[pattern][0] is not sprite:
+			xs, ys, colors = zip(*get_opaque_pixels(sprite))
+			self.pattern_pixels[pattern] = (sprite, (numpy.array(xs), numpy.array(ys), colors))
+		return self.pattern_pixels[pattern][1]
+
+	def move_down(self, amount):
+		""" Moves every star down with _amount_ of pixels. Stars gone past bottom border appear at the top. """
+		self.ys += amount
+		wrapped = self.ys + sprites.DIGIT_PATTERN_SIZE[1] > self.height
+		wrapped_count = numpy.count_nonzero(wrapped)
+		if wrapped_count:
+			self.xs[wrapped] = self.rng.randint(0, self.width, wrapped_count)
+			self.ys[wrapped] = 0
+
+	def update(self, sec):
+		""" Updates background for _sec_ seconds after the last call. """
+		self.move_down(LEVEL_SPEED * sec)
+
+	def draw(self, screen):
+		""" Fills _screen_ with background color and writes pixels of every star right into it,
+		the same as if star sprites were blitted. """
+		screen.fill(BACK_COLOR)
+		width, height = screen.get_size()
+		xs, ys = self.xs.astype(int), self.ys.astype(int)
+		# 24 bit surfaces have no integer pixels view, so they are written as RGB.
+		rgb = screen.get_bytesize() == 3
+		pixels = pygame.surfarray.pixels3d(screen) if rgb else pygame.surfarray.pixels2d(screen)
+		for pattern in (False, True):
+			shift_xs, shift_ys, colors = self.get_pattern_pixels(pattern)
+			colors = numpy.array(colors if rgb else [screen.map_rgb(color) for color in colors])
+			selected = self.patterns == pattern
+			# Every opaque pixel of every star of the pattern.
+			pixel_xs = (xs[selected, None] + shift_xs).ravel()
+			pixel_ys = (ys[selected, None] + shift_ys).ravel()
+			pixel_colors = numpy.tile(colors, (numpy.count_nonzero(selected),) + (1,) * (colors.ndim - 1))
+			visible = (pixel_xs < width) & (pixel_ys < height)
+			pixels[pixel_xs[visible], pixel_ys[visible]] = pixel_colors[visible]
+		# Surface stays locked while its pixels are referenced.
+		del pixels
+
+# Arrays of ProjectileStore which hold one value per bullet, in the order they are grown and compacted.
+STORE_ARRAYS = ["bullets", "pos", "last_pos", "velocity", "radius", "alive", "kinds"]
+# Max number of object and bullet pairs tested at once, so tests of big crowds don't take much memory.
+COLLISION_BLOCK = 65536
+
+class ProjectileStore:
+	""" Keeps bullets in arrays and does everything to them there, all at once: collides, moves, culls.
+	Stored bullets are not level objects and never update themselves, their positions are written back only on sync.
+	Bullets of the same class and sprite are of the same kind, they are tested and drawn together.
+	Bullets never interact with each other, only with level objects. """
+
+	def __init__(self, capacity=256):
+		self.count = 0
+		self.bullets = numpy.empty(capacity, dtype=object)
+		self.pos = numpy.zeros((capacity, 2))
+		self.last_pos = numpy.zeros((capacity, 2))
+		self.velocity = numpy.zeros((capacity, 2))
+		self.radius = numpy.zeros(capacity)
+		self.alive = numpy.zeros(capacity, dtype=bool)
+		self.kinds = numpy.zeros(capacity, dtype=int)
+		# (class, sprite) of every kind, kind is the index in the list.
+		self.kind_list = []
+		self.kind_index = {}
+
+	def get_kind(self, bullet):
+		key = (bullet.__class__, bullet.sprite)
+		if key not in self.kind_index:
+			self.kind_index[key] = len(self.kind_list)
+			self.kind_list.append(key)
+		return self.kind_index[key]
+
+	def add(self, bullets):
+		""" Puts _bullets_ (list) into the store. """
+		if not bullets:
+			return
+		start, end = self.count, self.count + len(bullets)
+		if end > len(self.pos):
+			capacity = max(end, len(self.pos) * 2)
+			for name in STORE_ARRAYS:
+				values = getattr(self, name)
+				setattr(self, name, numpy.resize(values, (capacity,) + values.shape[1:]))
+		for index, bullet in enumerate(bullets, start):
+			self.bullets[index] = bullet
+		self.pos[start:end] = [bullet.pos for bullet in bullets]
+		self.last_pos[start:end] = [bullet.last_pos for bullet in bullets]
+		self.velocity[start:end] = [bullet.velocity for bullet in bullets]
+		self.radius[start:end] = [bullet.radius for bullet in bullets]
+		self.alive[start:end] = True
+		self.kinds[start:end] = [self.get_kind(bullet) for bullet in bullets]
+		self.count = end
+
+	def collide(self, objs, collidees, table):
+		""" Tests stored bullets against level objects _objs_ the way collision.find_collisions does with _table_.
+		Bullets go to _collidees_ of objects which react to them (list for every object of _objs_, see find_collisions),
+		bullets which react to objects die. Objects of one class are tested against bullets of one kind at once. """
+		count = self.count
+		if not count or not objs:
+			return
+		by_class = {}
+		for index, o in enumerate(objs):
+			by_class.setdefault(o.__class__, []).append(index)
+		kinds = self.kinds[:count]
+		for kind, (bullet_class, sprite) in enumerate(self.kind_list):
+			indices = numpy.flatnonzero(kinds == kind)
+			if not len(indices):
+				continue
+			for obj_class, obj_indices in by_class.items():
+				reacts = table[obj_class, bullet_class]
+				if not reacts:
+					continue
+				rows, cols = self.find_hits([objs[index] for index in obj_indices], indices, reacts[2])
+				if not len(rows):
+					continue
+				if reacts[0]:
+					hit_bullets = self.bullets[indices[cols]].tolist()
+					for row, bullet in zip(rows.tolist(), hit_bullets):
+						collidees[obj_indices[row]].append(bullet)
+				if reacts[1]:
+					self.alive[indices[cols]] = False
+
+	def find_hits(self, objs, indices, test):
+		""" Tests every object of _objs_ against every stored bullet at _indices_ with _test_
+		(objects_swept_colliding or objects_colliding, objects go first). Returns arrays of (object, bullet) pairs which collide:
+		indices in _objs_ and in _indices_. Arithmetic is the same as in the test, so are the results. """
+		pos = numpy.array([o.pos for o in objs], dtype=float)
+		last_pos = numpy.array([o.last_pos for o in objs], dtype=float)
+		radius = numpy.array([o.radius for o in objs], dtype=float)
+		bullet_pos, bullet_last_pos, bullet_radius = self.pos[indices], self.last_pos[indices], self.radius[indices]
+		rows, cols = [], []
+		block = max(1, COLLISION_BLOCK // len(indices))
+		for first in xrange(0, len(objs), block):
+			x, y = pos[first:first + block, 0, None], pos[first:first + block, 1, None]
+			if test is objects_swept_colliding:
+				start_x = last_pos[first:first + block, 0, None] - bullet_last_pos[:, 0]
+				start_y = last_pos[first:first + block, 1, None] - bullet_last_pos[:, 1]
+				shift_x = x - bullet_pos[:, 0] - start_x
+				shift_y = y - bullet_pos[:, 1] - start_y
+				shift_length = shift_x * shift_x + shift_y * shift_y
+				moved = shift_length != 0
+				t = numpy.ones(shift_length.shape)
+				t[moved] = numpy.clip(-(start_x * shift_x + start_y * shift_y)[moved] / shift_length[moved], 0.0, 1.0)
+				distance = numpy.hypot(start_x + shift_x * t, start_y + shift_y * t)
+			else:
+				distance = numpy.hypot(x - bullet_pos[:, 0], y - bullet_pos[:, 1])
+			block_rows, block_cols = numpy.nonzero(distance < radius[first:first + block, None] + bullet_radius)
+			rows.append(block_rows + first)
+			cols.append(block_cols)
+		return numpy.concatenate(rows), numpy.concatenate(cols)
+
+	def move(self, sec):
+		""" Moves every bullet for _sec_ seconds. """
+		count = self.count
+		self.last_pos[:count] = self.pos[:count]
+		self.pos[:count] += self.velocity[:count] * sec
+
+	def cull(self, view_box):
+		""" Drops dead bullets and bullets whose boxes (see Object.get_box) are out of _view_box_ (left, top, right, bottom).
+		Returns list of dropped bullets. """
+		count = self.count
+		if not count:
+			return []
+		view_left, view_top, view_right, view_bottom = view_box
+		pos, radius = self.pos[:count], self.radius[:count]
+		left = numpy.trunc(pos[:, 0] - radius)
+		top = numpy.trunc(pos[:, 1] - radius)
+		size = numpy.trunc(radius * 2)
+		keep = self.alive[:count] & (left < view_right) & (top < view_bottom) & (left + size > view_left) & (top + size > view_top)
+		kept_count = numpy.count_nonzero(keep)
+		if kept_count == count:
+			return []
+		dropped = self.bullets[:count][~keep].tolist()
+		for name in STORE_ARRAYS:
+			values = getattr(self, name)
+			values[:kept_count] = values[:count][keep]
+		# Dropped bullets go back to pools, store shouldn't hold them.
+		self.bullets[kept_count:count] = None
+		self.count = kept_count
+		return dropped
+
+	def interpolate(self, alpha):
+		""" Returns array of positions of bullets in between the ones before and after the last tick (see Painter.draw_object). """
+		count = self.count
+		last_pos = self.last_pos[:count]
+		return last_pos + (self.pos[:count] - last_pos) * alpha
+
+	def sync(self):
+		""" Writes positions back to stored bullets. Returns list of them. """
+		count = self.count
+		bullets = self.bullets[:count].tolist()
+		for bullet, pos, last_pos in zip(bullets, self.pos[:count].tolist(), self.last_pos[:count].tolist()):
+			bullet.pos = tuple(pos)
+			bullet.last_pos = tuple(last_pos)
+		return bullets
+
+def update_tempers(formations, sec):
+	""" Does the same as update_tempers(sec) of every formation of _formations_, but all at once:
+	tempers are grouped by class and computed in arrays. """
+	if not formations:
+		return
+
+	# Shoot tempers: wait until the next group of shots.
+	shoot_tempers = [f.shoot_temper for f in formations]
+	group_count = numpy.array([t.group_count for t in shoot_tempers])
+	delay = numpy.array([t.current_group_delay for t in shoot_tempers], dtype=float)
+	waiting = (group_count <= 0) | (delay > 0)
+	delay[waiting] -= sec
+	for index, new_delay in zip(numpy.flatnonzero(waiting).tolist(), delay[waiting].tolist()):
+		shoot_tempers[index].current_group_delay = new_delay
+
+	# Move tempers of the same class are updated together, tempers of other classes update themselves.
+	by_class = {}
+	for f in formations:
+		by_class.setdefault(f.move_temper.__class__, []).append(f.move_temper)
+	for temper_class, tempers in by_class.items():
+		if temper_class is controller.HunterMoveTemper:
+			update_hunters(tempers)
+		elif temper_class is controller.PendulumMoveTemper:
+			update_pendulums(tempers)
+		else:
+			for temper in tempers:
+				temper.update(sec)
+
+def update_hunters(tempers):
+	""" Same as HunterMoveTemper.update for every temper of _tempers_. """
+	tempers = [t for t in tempers if t.target.is_alive()]
+	if not tempers:
+		return
+	target_x = numpy.array([t.target.pos[0] for t in tempers], dtype=float)
+	x = numpy.array([t.parent_controller.get_pos()[0] for t in tempers], dtype=float)
+	shift = numpy.clip(target_x - x, -ENEMY_SPEED, ENEMY_SPEED)
+	for temper, temper_shift in zip(tempers, shift.tolist()):
+		temper.movement = (temper_shift, ENEMY_SPEED)
+
+def update_pendulums(tempers):
+	""" Same as PendulumMoveTemper.update for every temper of _tempers_. """
+	x = numpy.array([t.parent_controller.get_pos()[0] for t in tempers], dtype=float)
+	left = numpy.array([t.movement_range[0] for t in tempers], dtype=float)
+	right = numpy.array([t.movement_range[1] for t in tempers], dtype=float)
+	new_x = numpy.minimum(numpy.maximum(x, left), right)
+	bounced = new_x != x
+	for index, temper_x in zip(numpy.flatnonzero(bounced).tolist(), new_x[bounced].tolist()):
+		tempers[index].parent_controller.set_x(temper_x)
+		tempers[index].bounce()
+	for temper in tempers:
+		temper.movement = (temper.side_shift, ENEMY_SPEED)
@@ -0,0 +1,334 @@
+# benchmark.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Benchmarks for the hot paths of the game.
+# Suite of named cases runs on dummy video driver and can be compared with a stored baseline:
+#   python benchmark.py --json baseline.json
+#   python benchmark.py --compare baseline.json
+# Exploratory comparison tables: python benchmark.py --tables
+
+import argparse
+import json
+import random
+import sys
+import timeit
+
+import pygame
+
+from defs import *
+import objects
+import controller
+import collision
+import arrays
+import level
+import sprites
+import variants
+import starfield
+import simulation
+import profiler
+import painter
+import stress
+
+COLLISION_COUNTS = [100, 300, 1000, 3000, 10000]
+ENTITY_COUNTS = [1000, 10000, 100000]
+BLIT_COUNT = 10000
+ALL_PAIRS_MAX_COUNT = 3000 # all-pairs test is too slow beyond that
+SUITE_COLLISION_COUNTS = [100, 1000, 3000]
+SUITE_REPEAT = 5
+SUITE_SEED = 0
+PAIR_TESTS = 100000
+PLAYED_TICKS = 3000 # a minute of play, when screen is full of enemies and bullets
+GAME_LOOP_DENSITY = 2.0 # enemy groups of the game loop level as multiple of normal (see stress.StressLevel)
+GAME_LOOP_FIRE_RATE = 4.0 # enemies of the game loop level fire that many times faster
+WARMUP_TICKS = 300 # ticks played before the game loop is timed, so the screen is crowded with enemies and bullets
+DRAW_CALLS = 100
+REGRESSION_THRESHOLD = 0.25 # case is a regression if it is slower than baseline by that fraction
+
+def measure(func, repeat=3, setup=None):
+	""" Returns the best time in seconds of _repeat_ calls of _func_.
+	If there is _setup_, its result is passed to every call of _func_ and it is not timed. """
+	best = None
+	for i in xrange(repeat):
+		args = (setup(),) if setup else ()
+		start = timeit.default_timer()
+		func(*args)
+		elapsed = timeit.default_timer() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+def random_object(pos):
+	""" Creates enemy ship or bullet of any side at _pos_. """
+	kind = random.randrange(5)
+	if kind == 0:
+		ai = controller.EnemyController(controller.ShootTemper(0.0, 0), controller.PawnMoveTemper())
+		return objects.EnemyShip(None, pos, ENEMY_SIZE, ai, ENEMY_RELOAD_TIME)
+	if kind in [1, 2]:
+		return objects.PlayerBullet(None, pos, BULLET_SIZE, PLAYER_BULLET_VELOCITY)
+	return objects.EnemyBullet(None, pos, BULLET_SIZE, ENEMY_BULLET_VELOCITY)
+
+def random_objects(count, area=SCREEN_SIZE):
+	""" Creates player and _count_ - 1 of enemies and bullets scattered across _area_. """
+	random_pos = lambda: (random.uniform(0, area[0]), random.uniform(0, area[1]))
+	player = objects.PlayerShip(None, random_pos(), PLAYER_SIZE, controller.PlayerController(), PLAYER_RELOAD_TIME, PLAYER_HEALTH)
+	return [player] + [random_object(random_pos()) for i in xrange(count - 1)]
+
+def bench_collisions(counts=COLLISION_COUNTS):
+	""" Compares spatial hash and all-pairs collision passes over the live screen area. """
+	print("%8s %14s %14s" % ("objects", "all pairs, ms", "hash, ms"))
+	for count in counts:
+		objs = random_objects(count)
+		table = collision.CollisionTable(objects.LEVEL_CLASSES)
+		hashed = measure(lambda: collision.find_collisions(objs, table))
+		all_pairs = "-"
+		if count <= ALL_PAIRS_MAX_COUNT:
+			all_pairs = "%.2f" % (measure(lambda: collision.find_collisions_all_pairs(objs), 1) * 1000)
+			assert collision.find_collisions(objs, table) == collision.find_collisions_all_pairs(objs)
+		print("%8d %14s %14.2f" % (count, all_pairs, hashed * 1000))
+
+def bench_entities(counts=ENTITY_COUNTS):
+	""" Compares moving and culling of bullets and moving of stars as objects and in arrays. """
+	view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+	sec = 1.0 / 60
+	print("%8s %14s %14s %14s %14s" % ("count", "bullets, ms", "arrays, ms", "stars, ms", "arrays, ms"))
+	for count in counts:
+		bullets = [objects.PlayerBullet(None, (random.uniform(0, SCREEN_SIZE[0]), random.uniform(0, SCREEN_SIZE[1])),
+			BULLET_SIZE, PLAYER_BULLET_VELOCITY) for i in xrange(count)]
+		def move_objects():
+			for bullet in bullets:
+				bullet.update(sec)
+			[bullet for bullet in bullets if view_rect.colliderect(bullet.get_rect())]
+		store = arrays.ProjectileStore()
+		store.add([objects.PlayerBullet(None, bullet.pos, BULLET_SIZE, PLAYER_BULLET_VELOCITY) for bullet in bullets])
+		def move_store():
+			store.move(sec)
+			store.cull((view_rect.left, view_rect.top, view_rect.right, view_rect.bottom))
+		background = level.Background(SCREEN_SIZE, count)
+		array_background = arrays.ArrayBackground(SCREEN_SIZE, count)
+		print("%8d %14.2f %14.2f %14.2f %14.2f" % (count,
+			measure(move_objects) * 1000, measure(move_store) * 1000,
+			measure(lambda: background.update(sec)) * 1000, measure(lambda: array_background.update(sec)) * 1000))
+
+def object_size(obj):
+	""" Returns memory taken by _obj_ itself and its attribute dict if it has one. """
+	size = sys.getsizeof(obj)
+	if hasattr(obj, "__dict__"):
+		size += sys.getsizeof(obj.__dict__)
+	return size
+
+def bench_objects(count=10000):
+	""" Measures memory per object and update throughput of bullets and enemy ships. """
+	sec = 1.0 / 60
+	bullets = [objects.PlayerBullet(None, (0.0, 0.0), BULLET_SIZE, PLAYER_BULLET_VELOCITY) for i in xrange(count)]
+	enemies = []
+	while len(enemies) < count:
+		ai = controller.EnemyController(controller.ShootTemper(0.0, 0), controller.PendulumMoveTemper((0, SCREEN_SIZE[0])))
+		enemies.append(objects.EnemyShip(None, (100.0, 0.0), ENEMY_SIZE, ai, ENEMY_RELOAD_TIME))
+	enemy = enemies[0]
+	enemy_size = object_size(enemy) + object_size(enemy.controller) + object_size(enemy.controller.shoot_temper) + object_size(enemy.controller.move_temper)
+	update_all = lambda objs: [o.update(sec) for o in objs]
+	print("%8s %14s %14s" % ("object", "bytes", "updates/sec"))
+	print("%8s %14d %14.0f" % ("bullet", object_size(bullets[0]), count / measure(lambda: update_all(bullets))))
+	print("%8s %14d %14.0f" % ("enemy", enemy_size, count / measure(lambda: update_all(enemies))))
+
+def bench_blits(count=BLIT_COUNT):
+	""" Compares blits of generated sprites and of the same sprites converted to display format. """
+	screen = painter.init_display()
+	named_sprites = {"enemy": sprites.ENEMY_SPRITE, "explode": sprites.EXPLODE_SPRITE, "player_bullet": sprites.PLAYER_BULLET_SPRITE}
+	variant_cache = variants.VariantCache(named_sprites)
+	positions = [(random.randrange(SCREEN_SIZE[0]), random.randrange(SCREEN_SIZE[1])) for i in xrange(count)]
+	def blit_all(sprite):
+		for pos in positions:
+			screen.blit(sprite, pos)
+	print("%14s %14s %14s" % ("sprite", "raw, ms", "converted, ms"))
+	for name in sorted(named_sprites):
+		print("%14s %14.2f %14.2f" % (name,
+			measure(lambda: blit_all(named_sprites[name])) * 1000,
+			measure(lambda: blit_all(variant_cache.get(name))) * 1000))
+
+def played_simulation(ticks=PLAYED_TICKS):
+	""" Returns simulation of a seeded level played by hunter pilot for _ticks_, so there is a typical crowd of objects.
+	Player is healed every tick, so it is still alive and the game goes on. """
+	view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+	random.seed(SUITE_SEED)
+	sim = simulation.Simulation(level.Level(view_rect, LEVEL_LENGTH, seed=SUITE_SEED), view_rect)
+	player = sim.level.player
+	for i in xrange(ticks):
+		sim.control(simulation.hunter_pilot(sim))
+		sim.update(simulation.HEADLESS_FRAME_TIME)
+		player.health = player.max_health
+	return sim
+
+def collision_cases():
+	""" Pairwise test and the whole collision pass of the main loop at several object counts. """
+	pairs = zip(random_objects(PAIR_TESTS), random_objects(PAIR_TESTS))
+	def test_pairs():
+		for first, second in pairs:
+			objects_colliding(first, second)
+	cases = [("objects_colliding", test_pairs, None)]
+	for count in SUITE_COLLISION_COUNTS:
+		objs = random_objects(count)
+		table = collision.CollisionTable(objects.LEVEL_CLASSES)
+		cases.append(("find_collisions_%d" % count, lambda objs=objs: collision.find_collisions(objs, table), None))
+	return cases
+
+def level_cases():
+	""" Level generation, release of all its enemies while it scrolls, background and a tick of play. """
+	view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+	sec = simulation.HEADLESS_FRAME_TIME
+	def new_level():
+		random.seed(SUITE_SEED)
+		return level.Level(view_rect, LEVEL_LENGTH)
+	def release_all(current_level):
+		while not current_level.is_ended_up():
+			current_level.update(sec)
+	background = level.Background(SCREEN_SIZE, STAR_COUNT, random.Random(SUITE_SEED))
+	def move_background():
+		for i in xrange(DRAW_CALLS):
+			background.move_down(LEVEL_SPEED * sec)
+	def play(sim):
+		ticks = simulation.run_headless(sim, sec, DRAW_CALLS, simulation.hunter_pilot)
+		assert ticks == DRAW_CALLS, "game is over after %d ticks" % ticks
+	return [("level_init", new_level, None),
+			("level_update", release_all, new_level),
+			("background_move_down", move_background, None),
+			("simulation_update", play, lambda: played_simulation(PLAYED_TICKS))]
+
+def painter_cases(screen):
+	""" Every draw method of Painter, called _DRAW_CALLS_ times on a typical frame. """
+	sim = played_simulation(PLAYED_TICKS)
+	frame_painter = painter.Painter()
+	background = level.Background(SCREEN_SIZE, STAR_COUNT, random.Random(SUITE_SEED))
+	star_field = starfield.Starfield(SCREEN_SIZE, STAR_COUNT, 3, random.Random(SUITE_SEED))
+	label = level.Label(WIN_TEXT, TEXT_DELAY)
+	player = sim.level.player
+	frame_profiler = profiler.FrameProfiler()
+	for i in xrange(DRAW_CALLS):
+		frame_profiler.begin_frame()
+		for phase in ["level", "collide", "update", "filter", "paint"]:
+			frame_profiler.mark(phase)
+		frame_profiler.end_frame(sim.level.objects)
+	def repeat_draw(draw):
+		def run():
+			for i in xrange(DRAW_CALLS):
+				draw()
+				frame_painter.drawn_rects = []
+		return run
+	def draw_objects():
+		for o in sim.level.objects:
+			frame_painter.draw_object(screen, o, 0.5)
+	def present():
+		for i in xrange(DRAW_CALLS):
+			frame_painter.draw_background(screen, background)
+			frame_painter.present(screen)
+	return [("draw_background", repeat_draw(lambda: frame_painter.draw_background(screen, background)), None),
+			("draw_background_starfield", repeat_draw(lambda: frame_painter.draw_background(screen, star_field)), None),
+			("draw_object", repeat_draw(draw_objects), None),
+			("draw_healthbar", repeat_draw(lambda: frame_painter.draw_healthbar(screen, player)), None),
+			("draw_label", repeat_draw(lambda: frame_painter.draw_label(screen, label)), None),
+			("draw_hud", repeat_draw(lambda: frame_painter.draw_hud(screen, sim, 60.0)), None),
+			("draw_profile", repeat_draw(lambda: frame_painter.draw_profile(screen, frame_profiler)), None),
+			("present", present, None)]
+
+def game_loop_cases(screen):
+	""" Ticks of the game loop on a crowded screen: simulation and painting of every tick as the game does,
+	with stars and bullets as objects and in arrays. """
+	sec = simulation.HEADLESS_FRAME_TIME
+	view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+	def new_game(use_arrays):
+		def setup():
+			random.seed(SUITE_SEED)
+			current_level = stress.StressLevel(view_rect, GAME_LOOP_DENSITY, GAME_LOOP_FIRE_RATE, seed=SUITE_SEED)
+			sim = simulation.Simulation(current_level, view_rect, use_arrays)
+			play(sim, WARMUP_TICKS)
+			return sim, stress.Scene(screen, STAR_COUNT, SUITE_SEED, use_arrays)
+		return setup
+	def play(sim, ticks, scene=None):
+		for i in xrange(ticks):
+			sim.control(simulation.hunter_pilot(sim))
+			sim.update(sec)
+			# Player never dies, so the crowd only grows.
+			sim.level.player.health = sim.level.player.max_health
+			if scene: scene.paint(sim, sec)
+	def play_game(game):
+		sim, scene = game
+		play(sim, DRAW_CALLS, scene)
+	cases = [("game_loop", play_game, new_game(False))]
+	if arrays.is_available():
+		cases.append(("game_loop_arrays", play_game, new_game(True)))
+	return cases
+
+def run_suite(repeat=SUITE_REPEAT):
+	""" Runs every case of the suite on dummy display. Returns dict: case name -> best time in ms. """
+	screen = painter.init_display(dummy=True)
+	random.seed(SUITE_SEED)
+	# Sprite generation goes first: it doesn't need display, everything after it uses sprites in display format as the game does.
+	cases = [("generate_sprites", sprites.generate_sprites, None)]
+	results = {}
+	for name, func, setup in cases:
+		results[name] = measure(func, repeat, setup) * 1000
+	sprites.use_display_format()
+	cases = collision_cases() + level_cases() + painter_cases(screen) + game_loop_cases(screen)
+	for name, func, setup in cases:
+		results[name] = measure(func, repeat, setup) * 1000
+	return results
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+	""" Prints _results_ next to _baseline_ (both are dicts: case name -> ms).
+	Returns list of names of cases which are slower than baseline by more than _threshold_ fraction. """
+	regressions = []
+	print("%28s %12s %12s %8s" % ("case", "baseline, ms", "now, ms", "ratio"))
+	for name in sorted(set(results) | set(baseline)):
+		if name not in baseline or name not in results:
+			print("%28s %12s %12s %8s" % (name, "%.3f" % baseline[name] if name in baseline else "-",
+				"%.3f" % results[name] if name in results else "-", "new" if name in results else "missing"))
+			continue
+		ratio = results[name] / max(baseline[name], 1e-9)
+		mark = ""
+		if ratio > 1 + threshold:
+			regressions.append(name)
+			mark = " REGRESSION"
+		print("%28s %12.3f %12.3f %8.2f%s" % (name, baseline[name], results[name], ratio, mark))
+	return regressions
+
+def run_tables():
+	random.seed(0)
+	bench_collisions()
+	if arrays.is_available():
+		bench_entities()
+	bench_objects()
+	bench_blits()
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark suite for simulation, collision and rendering hot paths.")
+	parser.add_argument("--json", metavar="FILE", help="write results to JSON file, e.g. to store a baseline")
+	parser.add_argument("--compare", metavar="BASELINE", help="compare results with JSON file written by --json, exit with 1 on regressions")
+	parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="slowdown fraction which counts as regression")
+	parser.add_argument("--repeat", type=int, default=SUITE_REPEAT, help="best of that many runs is taken for every case")
+	parser.add_argument("--tables", action="store_true", help="print exploratory comparison tables instead of running the suite")
+	args = parser.parse_args()
+
+	if args.tables:
+		run_tables()
+		return
+
+	baseline = None
+	if args.compare:
+		with open(args.compare) as stream:
+			baseline = json.load(stream)["results"]
+	results = run_suite(args.repeat)
+	if args.json:
+		with open(args.json, "w") as stream:
+			json.dump({"repeat": args.repeat, "results": results}, stream, indent=1, sort_keys=True)
+	if baseline is None:
+		for name in sorted(results):
+			print("%28s %10.3f ms" % (name, results[name]))
+		return
+	regressions = compare(results, baseline, args.threshold)
+	if regressions:
+		print("%d regressions: %s" % (len(regressions), ", ".join(regressions)))
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
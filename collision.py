@@ -0,0 +1,95 @@
+# collision.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Broad phase of collision detection: spatial hash which finds only nearby pairs of objects.
+
+from defs import *
+
+# Neighbour cells to test against: current one and half of the surrounding ones, so every pair of cells is tested once.
+NEIGHBOUR_CELLS = [(1, 0), (-1, 1), (0, 1), (1, 1)]
+
+def build_grid(points, cell_size):
+	""" Puts indices of _points_ (list of (x, y)) into square cells of _cell_size_.
+	Returns dict (cell_x, cell_y) -> list of indices. """
+	cells = {}
+	for i, (x, y) in enumerate(points):
+		key = (int(x // cell_size), int(y // cell_size))
+		if key in cells:
+			cells[key].append(i)
+		else:
+			cells[key] = [i]
+	return cells
+
+def get_bounds(o):
+	""" Returns (x, y, radius) of a circle which covers _o_ all the way from last_pos to pos. """
+	(last_x, last_y), (x, y) = o.last_pos, o.pos
+	return ((last_x + x) / 2.0, (last_y + y) / 2.0, o.radius + math.hypot(x - last_x, y - last_y) / 2.0)
+
+def get_colliding_test(first, second):
+	""" Returns collision test for a pair of classes: swept one if any of them is swept. """
+	return objects_swept_colliding if first.swept or second.swept else objects_colliding
+
+class CollisionTable(dict):
+	""" Pair-dispatch table: maps pair of object classes (first, second) to tuple
+	(first reacts to second, second reacts to first, collision test) or to None if they never interact.
+	Reactions are declared in collides_with of every class. """
+
+	def __init__(self, classes):
+		""" Fills table for every pair of _classes_ at once. Other pairs are added on demand. """
+		dict.__init__(self)
+		for first in classes:
+			for second in classes:
+				self[first, second]
+
+	def __missing__(self, pair):
+		first, second = pair
+		reacts = (issubclass(second, first.collides_with), issubclass(first, second.collides_with), get_colliding_test(first, second))
+		if not reacts[0] and not reacts[1]:
+			reacts = None
+		self[pair] = reacts
+		return reacts
+
+def find_collisions(objs, table):
+	""" Returns list of collidees for every object of _objs_ (in the same order).
+	Only pairs which can interact according to _table_ are tested, each pair only once.
+	Object gets only collidees it reacts to, in the order of _objs_,
+	so the result is the same as of the all-pairs test. """
+	collidees = [[] for o in objs]
+	if not objs:
+		return collidees
+
+	def test(i, j):
+		first, second = objs[i], objs[j]
+		reacts = table[first.__class__, second.__class__]
+		if reacts and reacts[2](first, second):
+			if reacts[0]:
+				collidees[i].append(j)
+			if reacts[1]:
+				collidees[j].append(i)
+
+	# Objects are put into cells by circles covering their last tick, as swept test checks the whole tick.
+	# Colliding objects have intersecting circles, which are never further than two max radii from each other,
+	# so they lie in the same or adjacent cells.
+	bounds = [get_bounds(o) for o in objs]
+	cell_size = 2 * max(radius for x, y, radius in bounds)
+	cells = build_grid([(x, y) for x, y, radius in bounds], cell_size)
+
+	for (cell_x, cell_y), members in cells.iteritems():
+		for n, i in enumerate(members):
+			for j in members[n + 1:]:
+				test(i, j)
+		for shift_x, shift_y in NEIGHBOUR_CELLS:
+			neighbours = cells.get((cell_x + shift_x, cell_y + shift_y))
+			if not neighbours:
+				continue
+			for i in members:
+				for j in neighbours:
+					test(i, j)
+
+	return [[objs[j] for j in sorted(indices)] if indices else indices for indices in collidees]
+
+def find_collisions_all_pairs(objs):
+	""" Reference all-pairs implementation of find_collisions. """
+	return [[other for other in objs if other != o and isinstance(other, o.collides_with) and get_colliding_test(o.__class__, other.__class__)(o, other)]
+			for o in objs]
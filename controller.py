@@ -2,16 +2,21 @@
 # author antifin 2011
 # license WTFPLv2
 #
-# Controllers for player and enemy ships. Also, all the shoot and move tempers enemy could have.
+# Controllers for player and enemy ships, formations of enemies. Also, all the shoot and move tempers enemy could have.
 
 from defs import *
 
-class Controller:
+class Controller(object):
 	""" A base controller for ships. """
+	__slots__ = ('shift', 'shooting', 'parent_ship')
 
 	def __init__(self):
 		self.reset()
 
+	def attach(self, ship):
+		""" Makes _ship_ controlled by this controller. """
+		self.parent_ship = ship
+
 	def shoot(self):
 		""" Tells controller that a shot have been done. """
 		self.shooting = False
@@ -25,6 +30,7 @@ class Controller:
 
 class PlayerController(Controller):
 	""" A controller for the player ship. It uses keyboard. """
+	__slots__ = ()
 
 	def press_up(self):
 		self.shift = (self.shift[0], self.shift[1] - PLAYER_SPEED)
@@ -41,17 +47,31 @@ class PlayerController(Controller):
 	def press_shoot(self):
 		self.shooting = True
 
-class MoveTemper:
+class MoveTemper(object):
 	""" Move temper for an AI such as enemy. """
+	__slots__ = ('movement', 'parent_controller')
 	
 	def __init__(self):
 		self.movement = (0, 0)
 
+	def fit_range(self, x_range):
+		""" Keeps horizontal movement inside _x_range_. Base temper doesn't move sideways. """
+		pass
+
+	def bounce(self):
+		""" Tells temper that sideways movement has reached the end of its range. """
+		pass
+
 	def update(self, sec):
 		self.movement = (0, ENEMY_SPEED)
 
 class HunterMoveTemper(MoveTemper):
-	""" Hunts down its target. """
+	""" Hunts down its target.
+	In a formation it steers the formation position, which is the place of its first ship, so the whole group
+	slides after the target keeping its shape instead of every ship closing in on the same column.
+	Formations are updated before ships and player move (see Level.update_formations), so the target position
+	is the one of the end of the previous tick. """
+	__slots__ = ('target',)
 
 	def __init__(self, target):
 		MoveTemper.__init__(self)
@@ -62,12 +82,12 @@ class HunterMoveTemper(MoveTemper):
 		if not self.target.is_alive():
 			return
 
-		parent_ship = self.parent_controller.parent_ship
-		shift = ensure_range(self.target.pos[0] - parent_ship.pos[0], (-ENEMY_SPEED, ENEMY_SPEED))
+		shift = ensure_range(self.target.pos[0] - self.parent_controller.get_pos()[0], (-ENEMY_SPEED, ENEMY_SPEED))
 		self.movement = (shift, ENEMY_SPEED)
 
 class PendulumMoveTemper(MoveTemper):
 	""" Moves like pendulum inside some range. """
+	__slots__ = ('movement_range', 'side_shift')
 
 	def __init__(self, movement_range):
 		MoveTemper.__init__(self)
@@ -76,27 +96,35 @@ class PendulumMoveTemper(MoveTemper):
 			self.movement_range = (self.movement_range[1], self.movement_range[0])
 		self.side_shift = ENEMY_SPEED
 	
+	def fit_range(self, x_range):
+		""" Narrows movement range to _x_range_. """
+		self.movement_range = (ensure_range(self.movement_range[0], x_range), ensure_range(self.movement_range[1], x_range))
+
+	def bounce(self):
+		self.side_shift = -self.side_shift
+
 	def update(self, sec):
-		parent_ship = self.parent_controller.parent_ship
-		x, y = parent_ship.pos
+		x = self.parent_controller.get_pos()[0]
 		new_x = ensure_range(x, self.movement_range)
 		if x != new_x:
-			parent_ship.pos = (new_x, y)
-			self.side_shift = -self.side_shift
+			self.parent_controller.set_x(new_x)
+			self.bounce()
 
 		self.movement = (self.side_shift, ENEMY_SPEED)
 
 class ScoutMoveTemper(MoveTemper):
 	""" Moves twice as faster as Pawn. """
+	__slots__ = ()
 
 	def update(self, sec):
 		self.movement = (0, ENEMY_SPEED * 2)
 
 class PawnMoveTemper(MoveTemper):
-	pass
+	__slots__ = ()
 
-class ShootTemper:
+class ShootTemper(object):
 	""" Basic shoot temper for ships. """
+	__slots__ = ('group_delay', 'current_group_delay', 'group_count', 'current_group_count')
 
 	def __init__(self, group_delay, group_count):
 		self.group_delay = group_delay
@@ -122,12 +150,25 @@ class ShootTemper:
 
 class EnemyController(Controller):
 	""" Basic enemy AI controller. """
+	__slots__ = ('shoot_temper', 'move_temper')
 
 	def __init__(self, shoot_temper, move_temper):
 		Controller.__init__(self)
 		self.shoot_temper = shoot_temper
 		self.move_temper = move_temper
 		self.move_temper.parent_controller = self
+
+	def get_pos(self):
+		""" Position tempers steer. """
+		return self.parent_ship.pos
+
+	def set_x(self, x):
+		""" Puts the ship to horizontal position _x_. Position before the last tick is shifted as well,
+		so drawing and swept collisions don't see a jump. """
+		ship = self.parent_ship
+		shift_x = x - ship.pos[0]
+		ship.pos = (x, ship.pos[1])
+		ship.last_pos = (ship.last_pos[0] + shift_x, ship.last_pos[1])
 	
 	def shoot(self):
 		if self.parent_ship.ready_to_shoot():
@@ -141,4 +182,88 @@ class EnemyController(Controller):
 			self.shooting = True
 		self.shift = self.move_temper.movement
 
+class Formation(Controller):
+	""" Controller shared by a group of enemy ships: one move and one shoot temper for all of them,
+	so the group keeps its shape and shoots in volleys. Ships keep only their own state: alive and reload.
+	Formation is updated once per tick (see Level.update_formations), ships just take shift and shooting from it.
+	Tempers steer formation position, which is the place of the first ship of the group. """
+	__slots__ = ('shoot_temper', 'move_temper', 'pos', 'origin_x', 'x_range', 'members', 'volley')
+
+	def __init__(self, shoot_temper, move_temper, pos, x_range):
+		""" Formation at _pos_ is steered by tempers, ships keep their initial offsets from it.
+		Formation horizontal position is kept within _x_range_, so all the ships stay in view. """
+		Controller.__init__(self)
+		Controller.reset(self)
+		self.shoot_temper = shoot_temper
+		self.move_temper = move_temper
+		self.move_temper.parent_controller = self
+		self.move_temper.fit_range(x_range)
+		self.pos = pos
+		self.origin_x = pos[0]
+		self.x_range = x_range
+		# Ships in play.
+		self.members = []
+		# Some ship has shot since the last update.
+		self.volley = False
+
+	def attach(self, ship):
+		""" Ships join formation when they come into view, see release. """
+		pass
+
+	def release(self, ship):
+		""" Puts _ship_ coming into view at the top in its place in formation.
+		Returns True if it is the first ship of formation in play, so formation should be updated from now on. """
+		ship.pos = ship.last_pos = (self.pos[0] + ship.pos[0] - self.origin_x, 0)
+		self.members.append(ship)
+		return len(self.members) == 1
+
+	def get_pos(self):
+		return self.pos
+
+	def set_x(self, x):
+		""" Moves formation with all its ships in play to horizontal position _x_.
+		Positions of ships before the last tick are shifted as well (see EnemyController.set_x). """
+		shift_x = x - self.pos[0]
+		self.pos = (x, self.pos[1])
+		for ship in self.members:
+			ship.pos = (ship.pos[0] + shift_x, ship.pos[1])
+			ship.last_pos = (ship.last_pos[0] + shift_x, ship.last_pos[1])
+
+	def shoot(self):
+		""" Ship has shot: volley is counted by shoot temper once for all the ships. """
+		self.volley = True
+
+	def reset(self):
+		""" Shift and shooting are shared by ships, they are changed by update of formation only. """
+		pass
+
+	def update(self, sec):
+		""" Ships don't update formation, see Level.update_formations. """
+		pass
+
+	def prepare(self, in_play):
+		""" Drops ships which are not in _in_play_ (set of level objects) anymore: killed or gone out of view.
+		Counts the last volley. Returns False if there are no ships in play anymore. """
+		self.members = [ship for ship in self.members if ship in in_play]
+		if not self.members:
+			return False
+		if self.volley:
+			self.volley = False
+			self.shoot_temper.shoot()
+		return True
+
+	def update_tempers(self, sec):
+		self.shoot_temper.update(sec)
+		self.move_temper.update(sec)
 
+	def apply_tempers(self, sec):
+		""" Takes shift and shooting for all the ships from updated tempers.
+		Sideways movement stops at the end of x range and move temper bounces off it. """
+		self.shooting = self.shoot_temper.want_to_shoot()
+		shift_x, shift_y = self.move_temper.movement
+		new_x = self.pos[0] + shift_x * sec
+		if sec and not self.x_range[0] <= new_x <= self.x_range[1]:
+			shift_x = (ensure_range(new_x, self.x_range) - self.pos[0]) / sec
+			self.move_temper.bounce()
+		self.shift = (shift_x, shift_y)
+		self.pos = (self.pos[0] + shift_x * sec, self.pos[1] + shift_y * sec)
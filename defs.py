@@ -10,6 +10,9 @@ import random
 HEALTHBAR_COLOR = (255, 255, 255)
 SCREEN_SIZE = (800, 600)
 STAR_COUNT = 500
+TICK_RATE = 60 # simulation ticks per sec
+MAX_FPS = 60 # frames per sec, 0 for no limit
+MAX_CATCH_UP_TICKS = 5 # ticks per frame
 STAR_COLOR = (0, 127, 0)
 BACK_COLOR = (0, 0, 0)
 TEXT_COLOR = (255, 255, 255)
@@ -23,12 +26,19 @@ BONUS_SIZE = 32
 ENEMY_SIZE = 32
 EXPLODE_SIZE = 48
 FONT_SIZE = 32
+HUD_FONT_SIZE = 24
+HUD_LINE_HEIGHT = 20
+HUD_MARGIN = 8
+TEXT_CACHE_SIZE = 64 # rendered texts
+PROFILE_HISTORY = 120 # frames
+PROFILE_OVERLAY_WIDTH = 200 # pixels
 
 
 LEVEL_SPEED = 50 # pixels per sec
 PLAYER_SPEED = 400.0 # pixels per sec
 PLAYER_RELOAD_TIME = 0.5 # seconds to reload
 PLAYER_HEALTH = 100 # hit points
+MAX_WEAPON_LEVEL = 6
 PLAYER_BULLET_VELOCITY = (0.0, -300.0) # pixels per sec
 PLAYER_AUX_LEFT_BULLET_VELOCITY = (-212.0, -212.0) # pixels per sec
 PLAYER_AUX_RIGHT_BULLET_VELOCITY = (212.0, -212.0) # pixels per sec
@@ -40,10 +50,14 @@ ENEMY_SPEED = 50
 ENEMY_BULLET_VELOCITY = (0.0, 300.0) # pixels per sec
 COLLISION_DAMAGE = 10 # hit points per collision
 EXPLODE_DELAY = 1.5 # seconds
+EXPLODE_VARIANTS = 4
+EXPLODE_FRAMES = 6
+EXPLODE_FRAME_TIME = EXPLODE_DELAY / EXPLODE_FRAMES # seconds
 LEVEL_LENGTH = 4000 # pixels
 ENEMY_GROUP_COUNT = 40
 ENEMY_GROUP_SIZE = 10
 ENEMY_DISTANCE = 48
+STREAM_SEGMENT_LENGTH = 600 # pixels
 
 probs = {
 		"PROB_CREATE_WEAPON_BONUS": 0.25,
@@ -68,6 +82,18 @@ def objects_colliding(first, second):
 	result = math.hypot(first.pos[0] - second.pos[0], first.pos[1] - second.pos[1]) < (first.radius + second.radius)
 	return result
 
+def objects_swept_colliding(first, second):
+	""" Checks the whole last tick instead of its end only: both objects are taken to move straight
+	from last_pos to pos, so fast objects can't jump over each other. """
+	start_x, start_y = first.last_pos[0] - second.last_pos[0], first.last_pos[1] - second.last_pos[1]
+	shift_x, shift_y = first.pos[0] - second.pos[0] - start_x, first.pos[1] - second.pos[1] - start_y
+	shift_length = shift_x * shift_x + shift_y * shift_y
+	# Relative position closest to zero within the tick.
+	t = 1.0
+	if shift_length:
+		t = ensure_range(-(start_x * shift_x + start_y * shift_y) / shift_length, (0.0, 1.0))
+	return math.hypot(start_x + shift_x * t, start_y + shift_y * t) < (first.radius + second.radius)
+
 def ensure_range(x, x_range): 
 	left, right = x_range
 	if x < left:
@@ -76,8 +102,8 @@ def ensure_range(x, x_range):
 		return right
 	return x
 
-def get_prob_cause(prob_map, default_builder):
-	dice = random.random()
+def get_prob_cause(prob_map, default_builder, rng=random):
+	dice = rng.random()
 	cur_prob = 0.0
 	for prob in prob_map:
 		cur_prob += probs[prob]
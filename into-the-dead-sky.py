@@ -7,237 +7,172 @@
 # A couple of bonus types, lots of enemies, keyboard controls.
 # Arrows - move. Space - shoot. Escape or Q - exit.
 
-import pygame
+import time
+STARTED = time.time()
+
+import argparse
 import random
-import math
-import copy
+import pygame
 
 from defs import *
 import sprites
-import controller
 import objects
-
-class Background:
-	""" Represent a background with all its stars as self.stars. """
-
-	def __init__(self, size, count):
-		""" Creates a background for screen with _size_ and fills it with _count_ of stars. """
-		self.width, self.height = size
-		self.stars = [(random.randrange(self.width), random.randrange(self.height), (random.randrange(2) == 0)) for i in xrange(count)]
-
-	def move_down(self, amount):
-		""" Moves every star down with _amount_ of pixels. """
-		new_stars = []
-		for x, y, pattern in self.stars:
-			if y + amount + sprites.DIGIT_PATTERN_SIZE[1] <= self.height:
-				new_stars.append((x, y + amount, pattern))
-			else:
-				new_stars.append((random.randrange(self.width), 0, pattern))
-		self.stars = new_stars
-
-	def update(self, sec):
-		""" Updates background for _sec_ seconds after the last call. """
-		self.move_down(LEVEL_SPEED * sec)
-
-class Label:
-	""" Represents an on-screen label for any important game moments.
-	Can also close the game after it is gone if there is need to. """
-
-	def __init__(self, text, lifetime, close_after=False):
-		self.close_after = close_after
-		self.time_left = lifetime
-		self.text = text
-	
-	def	is_alive(self):
-		return self.time_left > 0
-
-	def update(self, sec):
-		if self.is_alive():
-			self.time_left -= sec
-
-class Painter:
-	""" Do all the painting jobs whatsoever. """
-
-	def draw_background(self, screen, background):
-		""" Clears screen before rendering of background so it should be first in a queue. """
-		screen.fill(BACK_COLOR)
-		for x, y, pattern in background.stars:
-			screen.blit(sprites.DIGIT_SPRITE[pattern], (x, y))
-	
-	def draw_label(self, screen, label):
-		""" Draws a big label on the screen centered. """
-		font = pygame.font.Font(None, FONT_SIZE)
-		sprite = font.render(label.text, True, TEXT_COLOR)
-		textpos = sprite.get_rect(centerx=screen.get_rect().centerx, centery=screen.get_rect().centery)
-		screen.blit(sprite, textpos)
-
-	def draw_healthbar(self, screen, player):
-			rect = pygame.Rect(player.get_rect().left, player.get_rect().bottom, player.get_rect().width, player.get_rect().height / 4)
-			rect.move_ip(0, rect.height)
-			ind_rect = rect.inflate(-4, -4)
-			ind_rect.width = ind_rect.width * player.health / player.max_health
-
-			if player.health < player.max_health / 2:
-				i = 255 * 2 * player.health / player.max_health
-				color = (255, i, 0)
-			else:
-				i = 255 * 2 * (player.health - player.max_health / 2) / player.max_health
-				color = (255 - i, 255, 0)
-			pygame.draw.rect(screen, HEALTHBAR_COLOR, rect, 1)
-			pygame.draw.rect(screen, color, ind_rect)
-	
-	def draw_object(self, screen, obj):
-		if isinstance(obj.sprite, pygame.Surface):
-			dest_rect = obj.sprite.get_rect()
-			dest_rect.center = obj.pos
-			screen.blit(obj.sprite, dest_rect)
-		else:
-			pygame.draw.circle(screen, obj.sprite, (int(obj.pos[0]), int(obj.pos[1])), int(obj.radius))
-
-		if isinstance(obj, objects.PlayerShip) and obj.health < obj.max_health:
-			self.draw_healthbar(screen, obj)
-
-class Level:
-	""" A main class that represents the whole level with all the objects. """
-
-	def __init__(self, view_rect, length):
-		""" Creates a new level with given length in seconds. """
-		self.length = length
-		self.player = objects.PlayerShip(sprites.PLAYER_SPRITE, view_rect.center, PLAYER_SIZE, controller.PlayerController(), PLAYER_RELOAD_TIME, PLAYER_HEALTH)
-		self.objects = [self.player]
-
-		random_x = lambda: random.randrange(ENEMY_SIZE, view_rect.width - ENEMY_SIZE)
-		self.queue = []
-		for i in xrange(ENEMY_GROUP_COUNT):
-			move_temper = get_prob_cause({
-				"PROB_SCOUT":    lambda: controller.ScoutMoveTemper(),
-				"PROB_PENDULUM": lambda: controller.PendulumMoveTemper((random_x(), random_x())),
-				"PROB_HUNTER":   lambda: controller.HunterMoveTemper(self.player),
-				"PROB_PAWN":     lambda: controller.PawnMoveTemper()
-				}, lambda: controller.PawnMoveTemper())
-
-			shoot_temper = get_prob_cause({
-				"PROB_SNIPER"  : lambda: controller.ShootTemper(3.0, 1),
-				"PROB_GUNNER"  : lambda: controller.ShootTemper(3.0, 3),
-				"PROB_NO_SHOOT": lambda: controller.ShootTemper(0.0, 0),
-				}, lambda: controller.ShootTemper(0.0, 0))
-
-			shift = get_prob_cause({
-				"PROB_H_LINE":    lambda: (ENEMY_DISTANCE, 0),
-				"PROB_BACKSLASH": lambda: (ENEMY_DISTANCE, ENEMY_DISTANCE),
-				"PROB_SLASH":     lambda: (-ENEMY_DISTANCE, ENEMY_DISTANCE),
-				"PROB_V_LINE":    lambda: (0, ENEMY_DISTANCE)
-				}, lambda: (0, ENEMY_DISTANCE))
-			group_size = random.randrange(0, ENEMY_GROUP_SIZE) + 1
-			group_width  = shift[0] * (group_size - 1) + math.copysign(ENEMY_SIZE * 2, shift[0])
-			group_height = shift[1] * (group_size - 1) + math.copysign(ENEMY_SIZE * 2, shift[1])
-
-			# min(start_pos, start_pos + group_width) > 0
-			# max(start_pos, start_pos + group_width) < view_rect.width
-			start_pos_x = view_rect.centerx
-			if 0 > group_width:
-				start_pos_x = random.randrange(ENEMY_SIZE - group_width, view_rect.width - ENEMY_SIZE)
-			if 0 < group_width:
-				start_pos_x = random.randrange(ENEMY_SIZE, view_rect.width - group_width - ENEMY_SIZE)
-			start_pos_y = self.length / 2
-			if 0 < group_height:
-				start_pos_y = random.randrange(view_rect.height / 2 - group_height, self.length - view_rect.height)
-			if 0 > group_height:
-				start_pos_y = random.randrange(view_rect.height / 2, self.length - view_rect.height - group_height)
-
-			positions = [(start_pos_x + shift[0] * i, start_pos_y + shift[1] * i) for i in xrange(group_size)]
-
-			for pos in positions:
-				ai = controller.EnemyController(copy.copy(shoot_temper), copy.copy(move_temper))
-				enemy = objects.EnemyShip(sprites.ENEMY_SPRITE, pos, ENEMY_SIZE, ai, ENEMY_RELOAD_TIME)
-				self.queue.append(enemy)
-
-		self.length += view_rect.height / 2
-
-	def is_ended_up(self):
-		return self.length <= 0
-
-	def update(self, sec):
-		if not self.is_ended_up():
-			self.length -= LEVEL_SPEED * sec
-
-			ready_objects = [o for o in self.queue if o.pos[1] > self.length]
-			for o in ready_objects:
-				o.pos = (o.pos[0], 0)
-				self.queue.remove(o)
-			self.objects.extend(ready_objects)
-
-def main():
-	pygame.init()
-	pygame.mouse.set_visible(False)
-	screen = pygame.display.set_mode(SCREEN_SIZE)
-	painter = Painter()
+import level
+import starfield
+import arrays
+import simulation
+import replay
+import profiler
+import painter
+
+def play(screen, frame_painter, star_count=STAR_COUNT, star_layers=0, use_arrays=False, endless=False, seed=None, recorder=None, game_replay=None,
+		frame_profiler=profiler.NULL_PROFILER, profile_overlay=False, tick_rate=TICK_RATE, max_fps=MAX_FPS):
+	""" Runs the game until it is over or closed. Endless level is generated on the fly and never ends.
+	Background is made of _star_layers_ of pre-rendered starfield or of separate stars if there are no layers.
+	With _use_arrays_ stars and bullets are kept in NumPy arrays.
+	Level is created with _seed_, every tick is written to _recorder_ (see replay.Recorder) if there is one.
+	With _game_replay_ its level is played with recorded frame times and keys as fast as possible.
+	Phases of every frame are marked in _frame_profiler_, which is shown on screen with _profile_overlay_.
+	Game runs with fixed _tick_rate_ ticks per sec whatever the frame rate is, at most _max_fps_ frames per sec are drawn.
+	Objects are drawn in between their last two ticks, so movement stays smooth when rates differ. """
 	clock = pygame.time.Clock()
 
-	background = Background(screen.get_size(), STAR_COUNT)
-	label = Label(START_TEXT, TEXT_DELAY)
-	level = Level(screen.get_rect(), LEVEL_LENGTH)
-
+	# Background has its own RNG, so it doesn't affect the game.
+	background_rng = random.Random()
+	if star_layers:
+		background = starfield.Starfield(screen.get_size(), star_count, star_layers, background_rng)
+	elif use_arrays:
+		background = arrays.ArrayBackground(screen.get_size(), star_count, background_rng)
+	else:
+		background = level.Background(screen.get_size(), star_count, background_rng)
+	label = level.Label(START_TEXT, TEXT_DELAY)
+	if game_replay:
+		current_level = game_replay.create_level(screen.get_rect())
+		recorded_frames = iter(game_replay.frames)
+	else:
+		current_level = replay.create_level(screen.get_rect(), seed, endless=endless)
+	sim = simulation.Simulation(current_level, screen.get_rect(), use_arrays, frame_profiler)
+
+	tick_sec = 1.0 / tick_rate
+	time_left = 0.0 # not simulated yet
 	pressed_keys = set()
 	while True:
+		frame_profiler.begin_frame()
 		for event in pygame.event.get():
 			if event.type == pygame.QUIT:
 				return
 			elif event.type == pygame.KEYDOWN:
 				if event.key in [pygame.K_q, pygame.K_ESCAPE]:
 					return
-				elif event.key in [pygame.K_UP, pygame.K_DOWN, pygame.K_RIGHT, pygame.K_LEFT, pygame.K_SPACE]:
+				elif event.key in simulation.CONTROL_KEYS:
 					pressed_keys |= set([event.key])
 			elif event.type == pygame.KEYUP:
-				if event.key in [pygame.K_UP, pygame.K_DOWN, pygame.K_RIGHT, pygame.K_LEFT, pygame.K_SPACE]:
+				if event.key in simulation.CONTROL_KEYS:
 					pressed_keys -= set([event.key])
+		frame_profiler.mark("events")
 
-		if pygame.K_UP in pressed_keys:
-			if level.player.get_rect().top > screen.get_rect().top:
-				level.player.controller.press_up()
-		if pygame.K_DOWN in pressed_keys:
-			if level.player.get_rect().bottom < screen.get_rect().bottom:
-				level.player.controller.press_down()
-		if pygame.K_RIGHT in pressed_keys:
-			if level.player.get_rect().right < screen.get_rect().right:
-				level.player.controller.press_right()
-		if pygame.K_LEFT in pressed_keys:
-			if level.player.get_rect().left > screen.get_rect().left:
-				level.player.controller.press_left()
-		if pygame.K_SPACE in pressed_keys:
-			level.player.controller.press_shoot()
-
-		sec = clock.tick() / 1000.0
-		level.update(sec)
-		background.update(sec)
-		if label: label.update(sec)
-
-		created_objects = reduce(lambda a, b: a + b,
-				map(lambda o: o.collide([other for other in level.objects if other != o and objects_colliding(o, other)]), level.objects) +
-				map(lambda o: o.update(sec), level.objects)
-				)
-		level.objects[0:0] = created_objects
-
-		if not level.player.is_alive() and label == None:
-			label = Label(LOSE_TEXT, TEXT_DELAY, close_after=True)
-
-		level.objects = [o for o in level.objects if o.is_alive()]
-		if [o for o in level.objects if isinstance(o, objects.EnemyShip) and o.get_rect().bottom > screen.get_rect().bottom]:
-			level.player.health = 0
-		level.objects = [o for o in level.objects if screen.get_rect().colliderect(o.get_rect())]
+		if game_replay:
+			clock.tick()
+			tick = next(recorded_frames, None)
+			if tick is None:
+				return
+			ticks = [tick]
+			alpha = 1.0
+		else:
+			# Time which can't be simulated within MAX_CATCH_UP_TICKS is dropped,
+			# otherwise slow ticks would make the next frame even slower.
+			time_left = min(time_left + clock.tick(max_fps) / 1000.0, tick_sec * MAX_CATCH_UP_TICKS)
+			ticks = []
+			while time_left >= tick_sec:
+				ticks.append((tick_sec, pressed_keys))
+				time_left -= tick_sec
+			alpha = time_left / tick_sec
+		frame_profiler.mark("wait")
+
+		for sec, tick_keys in ticks:
+			if recorder: recorder.record(sec, tick_keys)
+			sim.control(tick_keys)
+			background.update(sec)
+			if label: label.update(sec)
+			frame_profiler.mark("background")
+			sim.update(sec)
+
+		if not current_level.player.is_alive() and label == None:
+			label = level.Label(LOSE_TEXT, TEXT_DELAY, close_after=True)
 
 		if label and not label.is_alive():
 			if label.close_after:
 				return
 			label = None
-		if level.is_ended_up() and label == None:
-			label = Label(WIN_TEXT, TEXT_DELAY, close_after=True)
-
-		painter.draw_background(screen, background)
-		for o in level.objects:
-			painter.draw_object(screen, o)
-		if label: painter.draw_label(screen, label)
-		pygame.display.flip()
+		if current_level.is_ended_up() and label == None:
+			label = level.Label(WIN_TEXT, TEXT_DELAY, close_after=True)
+
+		frame_painter.draw_background(screen, background)
+		if sim.projectiles:
+			frame_painter.draw_projectiles(screen, sim.projectiles, alpha)
+		for o in current_level.objects:
+			frame_painter.draw_object(screen, o, alpha)
+		if label: frame_painter.draw_label(screen, label)
+		frame_painter.draw_hud(screen, sim, clock.get_fps())
+		if profile_overlay: frame_painter.draw_profile(screen, frame_profiler)
+		frame_profiler.mark("paint")
+		frame_painter.present(screen)
+		frame_profiler.mark("present")
+		if frame_profiler.enabled:
+			frame_profiler.end_frame(sim.get_objects())
+
+def main():
+	parser = argparse.ArgumentParser(description="Into the dead sky - shoot'em up scroller.")
+	parser.add_argument("--full-redraw", action="store_true", help="redraw and push the whole screen every frame")
+	parser.add_argument("--stars", type=int, default=STAR_COUNT, help="number of stars")
+	parser.add_argument("--star-layers", type=int, default=0, help="draw stars on that many pre-rendered parallax layers")
+	parser.add_argument("--arrays", action="store_true", help="keep stars and bullets in NumPy arrays")
+	parser.add_argument("--endless", action="store_true", help="play endless level")
+	parser.add_argument("--seed", type=int, default=None, help="seed for level generation")
+	parser.add_argument("--record", metavar="FILE", help="record the game to a replay file")
+	parser.add_argument("--replay", metavar="FILE", help="replay a recorded game as fast as possible")
+	parser.add_argument("--tick-rate", type=int, default=TICK_RATE, help="simulation ticks per sec")
+	parser.add_argument("--max-fps", type=int, default=MAX_FPS, help="max frames per sec, 0 for no limit")
+	parser.add_argument("--profile", action="store_true", help="show time of frame phases and objects on screen, print startup time, pushed pixels and pool use on exit")
+	parser.add_argument("--profile-dump", metavar="FILE", help="write time of frame phases and objects of recent frames to CSV or JSON (*.json) file on exit")
+	args = parser.parse_args()
+	if args.arrays and not arrays.is_available():
+		parser.error("--arrays requires NumPy")
+	if args.record and args.replay:
+		parser.error("--record and --replay cannot be used together")
+
+	seed = args.seed if args.seed is not None else replay.new_seed()
+	recorder, record_stream, game_replay = None, None, None
+	if args.record:
+		record_stream = open(args.record, "wb")
+		recorder = replay.Recorder(record_stream, seed, endless=args.endless)
+	if args.replay:
+		with open(args.replay, "rb") as stream:
+			game_replay = replay.Replay(stream)
+
+	pygame.init()
+	pygame.mouse.set_visible(False)
+	screen = pygame.display.set_mode(SCREEN_SIZE)
+	sprites.use_display_format()
+	game_painter = painter.Painter(dirty_rects=not args.full_redraw)
+
+	frame_profiler = profiler.NULL_PROFILER
+	if args.profile or args.profile_dump:
+		frame_profiler = profiler.FrameProfiler()
+
+	play(screen, game_painter, args.stars, args.star_layers, args.arrays, args.endless, seed, recorder, game_replay, frame_profiler, args.profile,
+			args.tick_rate, args.max_fps)
+	if args.profile_dump:
+		frame_profiler.dump(args.profile_dump)
+	if record_stream:
+		record_stream.close()
+		print("recorded %d frames with seed %d" % (recorder.frames, seed))
+	if args.profile:
+		if game_painter.first_frame_time:
+			print("startup to first frame: %.3f sec" % (game_painter.first_frame_time - STARTED))
+		print("pixels pushed per frame: %d" % game_painter.pixels_per_frame())
+		for name, (hits, misses) in sorted(objects.pool_stats().items()):
+			print("pool %s: %d hits, %d misses" % (name, hits, misses))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+# level.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Level with all its objects and enemy queue, scrolling background and on-screen labels.
+
+import random
+import math
+import heapq
+
+from defs import *
+import sprites
+import controller
+import objects
+import arrays
+
+class Background:
+	""" Represent a background with all its stars as self.stars. """
+
+	def __init__(self, size, count, rng=random):
+		""" Creates a background for screen with _size_ and fills it with _count_ of stars.
+		_rng_ is a source of randomness (random module itself or random.Random). """
+		self.width, self.height = size
+		self.rng = rng
+		self.stars = [(rng.randrange(self.width), rng.randrange(self.height), (rng.randrange(2) == 0)) for i in xrange(count)]
+
+	def move_down(self, amount):
+		""" Moves every star down with _amount_ of pixels. """
+		new_stars = []
+		for x, y, pattern in self.stars:
+			if y + amount + sprites.DIGIT_PATTERN_SIZE[1] <= self.height:
+				new_stars.append((x, y + amount, pattern))
+			else:
+				new_stars.append((self.rng.randrange(self.width), 0, pattern))
+		self.stars = new_stars
+
+	def update(self, sec):
+		""" Updates background for _sec_ seconds after the last call. """
+		self.move_down(LEVEL_SPEED * sec)
+
+class Label:
+	""" Represents an on-screen label for any important game moments.
+	Can also close the game after it is gone if there is need to. """
+
+	def __init__(self, text, lifetime, close_after=False):
+		self.close_after = close_after
+		self.time_left = lifetime
+		self.text = text
+	
+	def	is_alive(self):
+		return self.time_left > 0
+
+	def update(self, sec):
+		if self.is_alive():
+			self.time_left -= sec
+
+def generate_group(rng, view_rect, player, start_depth):
+	""" Creates enemies of a random group. Returns list of enemies, which share one formation.
+	_rng_ is a source of randomness (random module itself or random.Random),
+	_start_depth_ is a function which returns depth of the group start for given group height. """
+	random_x = lambda: rng.randrange(ENEMY_SIZE, view_rect.width - ENEMY_SIZE)
+	move_temper = get_prob_cause({
+		"PROB_SCOUT":    lambda: controller.ScoutMoveTemper(),
+		"PROB_PENDULUM": lambda: controller.PendulumMoveTemper((random_x(), random_x())),
+		"PROB_HUNTER":   lambda: controller.HunterMoveTemper(player),
+		"PROB_PAWN":     lambda: controller.PawnMoveTemper()
+		}, lambda: controller.PawnMoveTemper(), rng)
+
+	shoot_temper = get_prob_cause({
+		"PROB_SNIPER"  : lambda: controller.ShootTemper(3.0, 1),
+		"PROB_GUNNER"  : lambda: controller.ShootTemper(3.0, 3),
+		"PROB_NO_SHOOT": lambda: controller.ShootTemper(0.0, 0),
+		}, lambda: controller.ShootTemper(0.0, 0), rng)
+
+	shift = get_prob_cause({
+		"PROB_H_LINE":    lambda: (ENEMY_DISTANCE, 0),
+		"PROB_BACKSLASH": lambda: (ENEMY_DISTANCE, ENEMY_DISTANCE),
+		"PROB_SLASH":     lambda: (-ENEMY_DISTANCE, ENEMY_DISTANCE),
+		"PROB_V_LINE":    lambda: (0, ENEMY_DISTANCE)
+		}, lambda: (0, ENEMY_DISTANCE), rng)
+	group_size = rng.randrange(0, ENEMY_GROUP_SIZE) + 1
+	group_width  = shift[0] * (group_size - 1) + math.copysign(ENEMY_SIZE * 2, shift[0])
+	group_height = shift[1] * (group_size - 1) + math.copysign(ENEMY_SIZE * 2, shift[1])
+
+	# min(start_pos, start_pos + group_width) > 0
+	# max(start_pos, start_pos + group_width) < view_rect.width
+	start_pos_x = view_rect.centerx
+	if 0 > group_width:
+		start_pos_x = rng.randrange(ENEMY_SIZE - group_width, view_rect.width - ENEMY_SIZE)
+	if 0 < group_width:
+		start_pos_x = rng.randrange(ENEMY_SIZE, view_rect.width - group_width - ENEMY_SIZE)
+	start_pos_y = start_depth(group_height)
+
+	positions = [(start_pos_x + shift[0] * i, start_pos_y + shift[1] * i) for i in xrange(group_size)]
+
+	# Whole group stays in view as long as its first ship stays in x range.
+	offsets = [0, shift[0] * (group_size - 1)]
+	x_range = (ENEMY_SIZE - min(offsets), view_rect.width - ENEMY_SIZE - max(offsets))
+	formation = controller.Formation(shoot_temper, move_temper, positions[0], x_range)
+	return [objects.EnemyShip(sprites.ENEMY_SPRITE, pos, ENEMY_SIZE, formation, ENEMY_RELOAD_TIME) for pos in positions]
+
+def stream_groups(view_rect, player, rng, length, group_count, endless=False):
+	""" Generates groups of level with _length_ segment by segment from the deepest one
+	with the same density as a level generated at once: _group_count_ groups between the depths where groups start.
+	Groups start deep enough to fit into the segment whole, unless the segment is shorter than the group.
+	Yields (release depth, enemies of the segment); no enemy of the segment is deeper than release depth.
+	Endless stream goes on beyond the level length. """
+	bottom = view_rect.height / 2
+	top = length - view_rect.height
+	# Counted in whole pixels and groups, so a finite level gets exactly _group_count_ groups.
+	span = max(1, top - bottom)
+	streamed = generated = 0
+	while endless or top > bottom:
+		segment_bottom = top - STREAM_SEGMENT_LENGTH
+		if not endless:
+			segment_bottom = max(segment_bottom, bottom)
+		streamed += top - segment_bottom
+		enemies = []
+		while generated < streamed * group_count // span:
+			enemies.extend(generate_group(rng, view_rect, player, lambda group_height: rng.randrange(segment_bottom, max(segment_bottom + 1, top - group_height))))
+			generated += 1
+		yield max([top] + [enemy.pos[1] for enemy in enemies]), enemies
+		top = segment_bottom
+
+class Level:
+	""" A main class that represents the whole level with all the objects. """
+
+	def __init__(self, view_rect, length, group_count=ENEMY_GROUP_COUNT, lazy=False, seed=None, endless=False):
+		""" Creates a new level with given length in seconds and _group_count_ of enemy groups.
+		Lazy level generates enemies segment by segment when they are close to appear, using its own RNG with _seed_.
+		Endless level is lazy and never ends, enemies keep coming with the same density. """
+		self.length = length
+		self.endless = endless
+		self.player = objects.PlayerShip(sprites.PLAYER_SPRITE, view_rect.center, PLAYER_SIZE, controller.PlayerController(), PLAYER_RELOAD_TIME, PLAYER_HEALTH)
+		self.objects = [self.player]
+		# Formations with ships in play.
+		self.formations = []
+
+		# Queue is a heap of (-depth, order, enemy), so the deepest enemy is always on top.
+		# Order of generation is kept to release simultaneous enemies in the same order.
+		# Orders are unique, so tuples never get to compare enemies themselves.
+		self.queue = []
+		self.queue_order = 0
+		self.stream = None
+		self.stream_depth = None
+		if lazy or endless:
+			self.stream = stream_groups(view_rect, self.player, random.Random(seed), length, group_count, endless)
+			self.pull_stream()
+		else:
+			def start_depth(group_height):
+				if 0 < group_height:
+					return random.randrange(view_rect.height / 2 - group_height, self.length - view_rect.height)
+				if 0 > group_height:
+					return random.randrange(view_rect.height / 2, self.length - view_rect.height - group_height)
+				return self.length / 2
+			for i in xrange(group_count):
+				self.enqueue(generate_group(random, view_rect, self.player, start_depth))
+
+		self.length += view_rect.height / 2
+
+	def enqueue(self, enemies):
+		for enemy in enemies:
+			heapq.heappush(self.queue, (-enemy.pos[1], self.queue_order, enemy))
+			self.queue_order += 1
+
+	def pull_stream(self):
+		""" Takes segments from level stream until the next one is too deep to appear soon. """
+		while self.stream:
+			if self.stream_depth is not None:
+				if self.stream_depth <= self.length:
+					return
+				self.enqueue(self.stream_enemies)
+			try:
+				self.stream_depth, self.stream_enemies = next(self.stream)
+			except StopIteration:
+				self.stream = None
+
+	def is_ended_up(self):
+		return self.length <= 0 and not self.endless
+
+	def update(self, sec):
+		if not self.is_ended_up():
+			self.length -= LEVEL_SPEED * sec
+			self.pull_stream()
+
+			ready = []
+			while self.queue and -self.queue[0][0] > self.length:
+				depth, order, o = heapq.heappop(self.queue)
+				ready.append((order, o))
+			ready.sort(key=lambda item: item[0])
+			for order, o in ready:
+				if o.controller.release(o):
+					self.formations.append(o.controller)
+				self.objects.append(o)
+
+	def update_formations(self, sec, batched=False):
+		""" Updates every formation with ships in play for _sec_ seconds and drops formations without them.
+		With _batched_ tempers of all formations are updated at once (requires NumPy, see arrays.update_tempers). """
+		if self.formations:
+			in_play = set(self.objects)
+			self.formations = [formation for formation in self.formations if formation.prepare(in_play)]
+		if batched:
+			arrays.update_tempers(self.formations, sec)
+		else:
+			for formation in self.formations:
+				formation.update_tempers(sec)
+		for formation in self.formations:
+			formation.apply_tempers(sec)
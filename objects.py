@@ -8,18 +8,42 @@ from defs import *
 import pygame
 import random
 import sprites
+import pool
 
-class Object:
+class Object(object):
 	""" A base class for all game objects. """
+	__slots__ = ('sprite', 'pos', 'radius', 'last_pos', 'box', 'box_pos')
+
+	# Classes of objects this one reacts to on collision. Other objects are never passed to collide().
+	collides_with = ()
+	# Collisions are checked along the whole path of the last tick (see objects_swept_colliding).
+	swept = False
+	# Pool to return objects of the class to when they are gone (see acquire).
+	pool = None
 
 	def __init__(self, sprite, pos, radius):
 		self.sprite = sprite
 		self.pos = pos
 		self.radius = radius
+		# Position before the last tick, objects are drawn in between (see Simulation.update).
+		self.last_pos = pos
+		# Position the box is cached for (see get_box).
+		self.box_pos = None
+
+	def get_box(self):
+		""" Returns integer (left, top, right, bottom) of get_rect without building a Rect.
+		Box is cached until pos changes: position is never changed in place, only replaced with a new tuple. """
+		pos = self.pos
+		if pos is not self.box_pos:
+			left, top = int(pos[0] - self.radius), int(pos[1] - self.radius)
+			size = int(self.radius * 2)
+			self.box = (left, top, left + size, top + size)
+			self.box_pos = pos
+		return self.box
 
 	def get_rect(self):
-		return pygame.Rect(int(self.pos[0] - self.radius), int(self.pos[1] - self.radius),
-				int(self.radius * 2), int(self.radius * 2))
+		left, top, right, bottom = self.get_box()
+		return pygame.Rect(left, top, right - left, bottom - top)
 
 	def is_alive(self):
 		""" Default behavior is always return True: base object simply don't die. """
@@ -28,8 +52,9 @@ class Object:
 	def move(self, shift):
 		self.pos = (self.pos[0] + shift[0], self.pos[1] + shift[1])
 
-	def collide(self, other):
+	def collide(self, collidees):
 		""" Process colliding with other objects.
+		Gets only objects of classes from collides_with.
 		Base implementation does nothing. """
 		return []
 
@@ -39,11 +64,14 @@ class Object:
 		return []
 
 class Explode(Object):
-	""" Appears after death of any ship. """
+	""" Appears after death of any ship. Animated: shows frames of shared _animation_ one by one. """
+	__slots__ = ('delay', 'animation', 'frame')
 
-	def __init__(self, sprite, pos, radius, delay):
-		Object.__init__(self, sprite, pos, radius)
+	def __init__(self, animation, pos, radius, delay):
+		Object.__init__(self, animation[0], pos, radius)
+		self.animation = animation
 		self.delay = delay
+		self.frame = 0
 
 	def is_alive(self):
 		""" Stays still until vanished. """
@@ -52,10 +80,13 @@ class Explode(Object):
 	def update(self, sec):
 		if self.is_alive():
 			self.delay -= sec
+			self.frame = ensure_range(int((EXPLODE_DELAY - self.delay) / EXPLODE_FRAME_TIME), (0, len(self.animation) - 1))
+			self.sprite = self.animation[self.frame]
 		return []
 
 class Bonus(Object):
 	""" Base bonus class. Just moves and collides with player. """
+	__slots__ = ('exists',)
 
 	def __init__(self, sprite, pos, radius):
 		Object.__init__(self, sprite, pos, radius)
@@ -69,18 +100,19 @@ class Bonus(Object):
 		return Object.update(self, sec)
 
 	def collide(self, collidees):
-		if [other for other in collidees if isinstance(other, PlayerShip)]:
+		if collidees:
 			self.exists = False
 		return []
 
 class WeaponBonus(Bonus):
-	pass
+	__slots__ = ()
 
 class HealthBonus(Bonus):
-	pass
+	__slots__ = ()
 
 class Ship(Object):
 	""" Base class for ships. """
+	__slots__ = ('reload_time', 'reload_delay', 'controller')
 
 	def __init__(self, sprite, pos, radius, controller, reload_time):
 		Object.__init__(self, sprite, pos, radius)
@@ -88,7 +120,7 @@ class Ship(Object):
 		self.reload_delay = reload_time
 
 		self.controller = controller
-		self.controller.parent_ship = self
+		self.controller.attach(self)
 	
 	def ready_to_shoot(self):
 		return self.reload_time <= 0
@@ -120,19 +152,23 @@ class Ship(Object):
 		created_objects.extend(Object.update(self, sec))
 
 		if not self.is_alive():
-			created_objects.append(Explode(sprites.EXPLODE_SPRITE, self.pos, EXPLODE_SIZE, EXPLODE_DELAY))
+			animation = sprites.EXPLODE_ANIMATIONS[int(self.pos[0]) % len(sprites.EXPLODE_ANIMATIONS)]
+			created_objects.append(acquire(Explode, animation, self.pos, EXPLODE_SIZE, EXPLODE_DELAY))
 
 		return created_objects
 
 class Bullet(Object):
 	""" Base bullet. Just flies, doesn't collide with objects. """
+	__slots__ = ('velocity', 'exists')
+
+	# Bullets are fast enough to jump over a ship in one tick.
+	swept = True
 
-	def __init__(self, sprite, pos, radius, velocity, foe_class = None):
+	def __init__(self, sprite, pos, radius, velocity):
 		""" Velocity is a direction vector. """
 		Object.__init__(self, sprite, pos, radius)
 		self.velocity = velocity
 		self.exists = True
-		self.foe_class = foe_class
 	
 	def is_alive(self):
 		return self.exists
@@ -142,20 +178,19 @@ class Bullet(Object):
 		return Object.update(self, sec)
 
 	def collide(self, collidees):
-		if [other for other in collidees if isinstance(other, self.foe_class)]:
+		if collidees:
 			self.exists = False
 		return []
 
 class PlayerBullet(Bullet):
-	def __init__(self, sprite, pos, radius, velocity):
-		Bullet.__init__(self, sprite, pos, radius, velocity, EnemyShip)
+	__slots__ = ()
 
 class EnemyBullet(Bullet):
-	def __init__(self, sprite, pos, radius, velocity):
-		Bullet.__init__(self, sprite, pos, radius, velocity, PlayerShip)
+	__slots__ = ()
 
 class EnemyShip(Ship):
 	""" Defines common enemy ship. """
+	__slots__ = ('exists',)
 
 	def __init__(self, sprite, pos, radius, controller, reload_time):
 		Ship.__init__(self, sprite, pos, radius, controller, reload_time)
@@ -168,8 +203,8 @@ class EnemyShip(Ship):
 		created_objects = Ship.update(self, sec)
 		if not self.is_alive():
 			new_bonus = get_prob_cause({
-				"PROB_CREATE_WEAPON_BONUS": lambda: WeaponBonus(sprites.WEAPON_BONUS_SPRITE, self.pos, BONUS_SIZE),
-				"PROB_CREATE_HEALTH_BONUS": lambda: HealthBonus(sprites.HEALTH_BONUS_SPRITE, self.pos, BONUS_SIZE)
+				"PROB_CREATE_WEAPON_BONUS": lambda: acquire(WeaponBonus, sprites.WEAPON_BONUS_SPRITE, self.pos, BONUS_SIZE),
+				"PROB_CREATE_HEALTH_BONUS": lambda: acquire(HealthBonus, sprites.HEALTH_BONUS_SPRITE, self.pos, BONUS_SIZE)
 				}, lambda: None)
 			if new_bonus:
 				created_objects.append(new_bonus)
@@ -178,21 +213,19 @@ class EnemyShip(Ship):
 	def shoot(self):
 		created_objects = []
 		if self.ready_to_shoot():
-			created_objects.extend([EnemyBullet(sprites.ENEMY_BULLET_SPRITE, self.pos, BULLET_SIZE, ENEMY_BULLET_VELOCITY)])
+			created_objects.extend([acquire(EnemyBullet, sprites.ENEMY_BULLET_SPRITE, self.pos, BULLET_SIZE, ENEMY_BULLET_VELOCITY)])
 		created_objects.extend(Ship.shoot(self))
 		return created_objects
 
 	def collide(self, collidees):
 		""" Collides only with player or its bullets. """
-		for other in collidees:
-			if isinstance(other, PlayerShip):
-				self.exists = False
-			if isinstance(other, PlayerBullet):
-				self.exists = False
+		if collidees:
+			self.exists = False
 		return []
 
 class PlayerShip(Ship):
 	""" Player ship. Extends base ship with health status and upgradable weapon. """
+	__slots__ = ('max_health', 'health', 'weapon_level')
 
 	def __init__(self, sprite, pos, radius, controller, reload_time, max_health):
 		Ship.__init__(self, sprite, pos, radius, controller, reload_time)
@@ -210,16 +243,16 @@ class PlayerShip(Ship):
 		3 - auxiliary;
 		4 - side bullets. """
 		if direction == 1:
-			return [PlayerBullet(sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_BULLET_VELOCITY)]
+			return [acquire(PlayerBullet, sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_BULLET_VELOCITY)]
 		elif direction == 2:
-			return [PlayerBullet(sprites.PLAYER_BULLET_SPRITE, (self.pos[0] - self.radius, self.pos[1]), BULLET_SIZE, PLAYER_BULLET_VELOCITY),
-					PlayerBullet(sprites.PLAYER_BULLET_SPRITE, (self.pos[0] + self.radius, self.pos[1]), BULLET_SIZE, PLAYER_BULLET_VELOCITY)]
+			return [acquire(PlayerBullet, sprites.PLAYER_BULLET_SPRITE, (self.pos[0] - self.radius, self.pos[1]), BULLET_SIZE, PLAYER_BULLET_VELOCITY),
+					acquire(PlayerBullet, sprites.PLAYER_BULLET_SPRITE, (self.pos[0] + self.radius, self.pos[1]), BULLET_SIZE, PLAYER_BULLET_VELOCITY)]
 		elif direction == 3:
-			return [PlayerBullet(sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_AUX_RIGHT_BULLET_VELOCITY),
-					PlayerBullet(sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_AUX_LEFT_BULLET_VELOCITY)]
+			return [acquire(PlayerBullet, sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_AUX_RIGHT_BULLET_VELOCITY),
+					acquire(PlayerBullet, sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_AUX_LEFT_BULLET_VELOCITY)]
 		elif direction == 4:
-			return [PlayerBullet(sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_SIDE_RIGHT_BULLET_VELOCITY),
-					PlayerBullet(sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_SIDE_LEFT_BULLET_VELOCITY)]
+			return [acquire(PlayerBullet, sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_SIDE_RIGHT_BULLET_VELOCITY),
+					acquire(PlayerBullet, sprites.PLAYER_BULLET_SPRITE, self.pos, BULLET_SIZE, PLAYER_SIDE_LEFT_BULLET_VELOCITY)]
 		else:
 			return []
 
@@ -236,14 +269,69 @@ class PlayerShip(Ship):
 		created_objects.extend(Ship.shoot(self))
 		return created_objects
 
+	def take_damage(self):
+		self.health = ensure_range(self.health - COLLISION_DAMAGE, (0, self.max_health))
+
+	def heal(self):
+		self.health = ensure_range(self.health + HEALTH_IMPROVEMENT, (0, self.max_health))
+
+	def upgrade_weapon(self):
+		self.weapon_level = ensure_range(self.weapon_level + 1, (1, MAX_WEAPON_LEVEL))
+
+	def get_effect_index(self, cls):
+		""" Returns index in collision_effects of the first effect for _cls_ or its base class, None if there is none.
+		Index is found once per class, the same way collision table matches classes with collides_with. """
+		if cls not in self.effect_indices:
+			self.effect_indices[cls] = None
+			for i, (effect_cls, effect) in enumerate(self.collision_effects):
+				if issubclass(cls, effect_cls):
+					self.effect_indices[cls] = i
+					break
+		return self.effect_indices[cls]
+
 	def collide(self, collidees):
-		for other in collidees:
-			if isinstance(other, EnemyShip) or isinstance(other, EnemyBullet):
-				self.health = ensure_range(self.health - COLLISION_DAMAGE, (0, self.max_health))
-			if isinstance(other, HealthBonus):
-				self.health = ensure_range(self.health + HEALTH_IMPROVEMENT, (0, self.max_health))
-			if isinstance(other, WeaponBonus):
-				self.weapon_level = ensure_range(self.weapon_level + 1, (1, 6))
+		""" Applies effect of every collidee (see collision_effects) in the order of effects,
+		so the result doesn't depend on the order of _collidees_. """
+		indices = [self.get_effect_index(other.__class__) for other in collidees]
+		for i in sorted(i for i in indices if i is not None):
+			self.collision_effects[i][1](self)
 		return []
 
+# Collision rules are set up here as they refer to classes defined above.
+Bonus.collides_with = (PlayerShip,)
+PlayerBullet.collides_with = (EnemyShip,)
+EnemyBullet.collides_with = (PlayerShip,)
+EnemyShip.collides_with = (PlayerShip, PlayerBullet)
+PlayerShip.collides_with = (EnemyShip, EnemyBullet, HealthBonus, WeaponBonus)
+# Damage goes before heal, as health is clipped after every effect.
+PlayerShip.collision_effects = [
+		(EnemyShip, PlayerShip.take_damage),
+		(EnemyBullet, PlayerShip.take_damage),
+		(HealthBonus, PlayerShip.heal),
+		(WeaponBonus, PlayerShip.upgrade_weapon)
+		]
+# Class of collidee -> index of its effect (see PlayerShip.get_effect_index).
+PlayerShip.effect_indices = {}
+
+# Short-lived objects are taken from pools and released back by simulation when they are gone.
+POOLS = dict((cls, pool.ObjectPool(cls)) for cls in [PlayerBullet, EnemyBullet, Explode, WeaponBonus, HealthBonus])
+for cls in POOLS:
+	cls.pool = POOLS[cls]
+
+def acquire(cls, *args):
+	""" Creates object of pooled _cls_, reusing released ones. """
+	return POOLS[cls].acquire(*args)
+
+def release(obj):
+	""" Returns _obj_ to the pool of its class if there is one. """
+	if obj.pool:
+		obj.pool.release(obj)
+
+def pool_stats():
+	""" Returns dict: class name -> (hits, misses). """
+	return dict((cls.__name__, (objects_pool.hits, objects_pool.misses)) for cls, objects_pool in POOLS.items())
+
+# All classes of objects which appear in a level.
+LEVEL_CLASSES = [PlayerShip, EnemyShip, PlayerBullet, EnemyBullet, WeaponBonus, HealthBonus, Explode]
+
 
@@ -0,0 +1,158 @@
+# painter.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Display setup, drawing of background, objects, labels and HUD, pushing of drawn frames to display.
+
+import os
+import time
+
+import pygame
+
+from defs import *
+import sprites
+import objects
+import starfield
+import arrays
+import text
+
+def init_display(dummy=False):
+	""" Sets display mode, using dummy video driver if there is no display or _dummy_ is set. """
+	if dummy:
+		os.environ["SDL_VIDEODRIVER"] = "dummy"
+	elif not os.environ.get("DISPLAY"):
+		os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+	pygame.init()
+	return pygame.display.set_mode(SCREEN_SIZE)
+
+class Painter:
+	""" Do all the painting jobs whatsoever.
+	In dirty rects mode it remembers every drawn rect, erases the rects of the previous frame
+	and pushes to display only both sets of rects instead of the whole screen. """
+
+	def __init__(self, dirty_rects=True):
+		self.dirty_rects = dirty_rects
+		self.full_frame = False
+		self.drawn_rects = []
+		self.last_rects = []
+		self.frames = 0
+		self.first_frame_time = None
+		self.pixels_pushed = 0
+		self.text_cache = None
+		self.hud = None
+
+	def get_text_cache(self):
+		""" Fonts can be loaded only after pygame.init, so cache is created on demand. """
+		if not self.text_cache:
+			self.text_cache = text.TextCache()
+			self.hud = text.Hud(self.text_cache)
+		return self.text_cache
+
+	def draw_background(self, screen, background):
+		""" Clears screen before rendering of background so it should be first in a queue.
+		Backgrounds which draw themselves cover the whole screen, so the whole frame is pushed. """
+		if isinstance(background, (starfield.Starfield, arrays.ArrayBackground)):
+			background.draw(screen)
+			self.full_frame = True
+			return
+
+		if self.dirty_rects:
+			for rect in self.last_rects:
+				screen.fill(BACK_COLOR, rect)
+		else:
+			screen.fill(BACK_COLOR)
+		for x, y, pattern in background.stars:
+			self.drawn_rects.append(screen.blit(sprites.DIGIT_SPRITE[pattern], (x, y)))
+	
+	def draw_label(self, screen, label):
+		""" Draws a big label on the screen centered. """
+		sprite = self.get_text_cache().render(label.text)
+		textpos = sprite.get_rect(center=screen.get_rect().center)
+		self.drawn_rects.append(screen.blit(sprite, textpos))
+
+	def draw_healthbar(self, screen, player, pos=None):
+			""" Draws health of _player_ under it at _pos_, which is the position after the last tick by default. """
+			if pos is None:
+				left, top, right, bottom = player.get_box()
+			else:
+				left, top = int(pos[0] - player.radius), int(pos[1] - player.radius)
+				right, bottom = left + int(player.radius * 2), top + int(player.radius * 2)
+			rect = pygame.Rect(left, bottom, right - left, (bottom - top) / 4)
+			rect.move_ip(0, rect.height)
+			ind_rect = rect.inflate(-4, -4)
+			ind_rect.width = ind_rect.width * player.health / player.max_health
+
+			if player.health < player.max_health / 2:
+				i = 255 * 2 * player.health / player.max_health
+				color = (255, i, 0)
+			else:
+				i = 255 * 2 * (player.health - player.max_health / 2) / player.max_health
+				color = (255 - i, 255, 0)
+			self.drawn_rects.append(pygame.draw.rect(screen, HEALTHBAR_COLOR, rect, 1))
+			pygame.draw.rect(screen, color, ind_rect)
+	
+	def draw_object(self, screen, obj, alpha=1.0):
+		""" Draws _obj_ in between its positions before and after the last tick: _alpha_ 0 is before, 1 is after. """
+		pos = (obj.last_pos[0] + (obj.pos[0] - obj.last_pos[0]) * alpha, obj.last_pos[1] + (obj.pos[1] - obj.last_pos[1]) * alpha)
+		if isinstance(obj.sprite, pygame.Surface):
+			dest_rect = obj.sprite.get_rect()
+			dest_rect.center = pos
+			self.drawn_rects.append(screen.blit(obj.sprite, dest_rect))
+		else:
+			self.drawn_rects.append(pygame.draw.circle(screen, obj.sprite, (int(pos[0]), int(pos[1])), int(obj.radius)))
+
+		if isinstance(obj, objects.PlayerShip) and obj.health < obj.max_health:
+			self.draw_healthbar(screen, obj, pos)
+
+	def draw_projectiles(self, screen, store, alpha=1.0):
+		""" Draws bullets of _store_ (see arrays.ProjectileStore) the same way as draw_object does, blitting bullets of a kind at once. """
+		pos = store.interpolate(alpha)
+		kinds = store.kinds[:store.count]
+		for kind, (bullet_class, sprite) in enumerate(store.kind_list):
+			kind_pos = pos[kinds == kind].astype(int).tolist()
+			if not kind_pos:
+				continue
+			if isinstance(sprite, pygame.Surface):
+				# Same as centering sprite rect on the position.
+				width, height = sprite.get_size()
+				self.drawn_rects.extend(screen.blits([(sprite, (x - width / 2, y - height / 2)) for x, y in kind_pos]))
+			else:
+				for (x, y), radius in zip(kind_pos, store.radius[:store.count][kinds == kind].astype(int).tolist()):
+					self.drawn_rects.append(pygame.draw.circle(screen, sprite, (x, y), radius))
+
+	def draw_hud(self, screen, sim, fps):
+		""" Draws score, weapon level and FPS in the top left corner. """
+		self.get_text_cache()
+		counters = [("score", sim.killed), ("weapon", sim.level.player.weapon_level), ("fps", int(fps))]
+		for line, (caption, value) in enumerate(counters):
+			self.drawn_rects.extend(self.hud.draw_counter(screen, (HUD_MARGIN, HUD_MARGIN + HUD_LINE_HEIGHT * line), caption, value))
+
+	def draw_profile(self, screen, frame_profiler):
+		""" Draws average frame time, ms per phase and live objects by class in the top right corner. """
+		self.get_text_cache()
+		phases, counts = frame_profiler.averages()
+		frame_ms = sum(ms for phase, ms in phases)
+		lines = [("fps", "%.0f" % (1000 / frame_ms if frame_ms else 0)), ("frame ms", "%.2f" % frame_ms)]
+		lines += [("%s ms" % phase, "%.2f" % ms) for phase, ms in phases]
+		lines += [(name, "%.0f" % counts[name]) for name in sorted(counts)]
+		x = screen.get_width() - PROFILE_OVERLAY_WIDTH
+		for line, (caption, value) in enumerate(lines):
+			self.drawn_rects.extend(self.hud.draw_counter(screen, (x, HUD_MARGIN + HUD_LINE_HEIGHT * line), caption, value))
+
+	def present(self, screen):
+		""" Pushes drawn frame to display. Should be the last in a queue. """
+		if self.dirty_rects and not self.full_frame:
+			rects = self.last_rects + self.drawn_rects
+			pygame.display.update(rects)
+			self.pixels_pushed += sum(rect.width * rect.height for rect in rects)
+		else:
+			pygame.display.flip()
+			self.pixels_pushed += screen.get_width() * screen.get_height()
+		if not self.frames:
+			self.first_frame_time = time.time()
+		self.frames += 1
+		self.full_frame = False
+		self.last_rects, self.drawn_rects = self.drawn_rects, []
+
+	def pixels_per_frame(self):
+		return self.pixels_pushed / max(1, self.frames)
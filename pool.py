@@ -0,0 +1,29 @@
+# pool.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Free lists for short-lived objects such as bullets and explodes.
+
+class ObjectPool:
+	""" Keeps released objects of one class and reinitializes them on acquire instead of creating new ones.
+	Counts hits (reused objects) and misses (newly created ones). """
+
+	def __init__(self, cls):
+		self.cls = cls
+		self.free = []
+		self.hits = 0
+		self.misses = 0
+
+	def acquire(self, *args):
+		""" Returns object initialized with _args_ as if it was created by cls(*args). """
+		if self.free:
+			self.hits += 1
+			obj = self.free.pop()
+			obj.__init__(*args)
+			return obj
+		self.misses += 1
+		return self.cls(*args)
+
+	def release(self, obj):
+		""" Returns _obj_ to the pool. It must not be used by anyone after that. """
+		self.free.append(obj)
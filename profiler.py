@@ -0,0 +1,95 @@
+# profiler.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Lightweight frame profiler: time of every phase of a frame and live objects by class
+# for a number of recent frames, dumped to CSV or JSON.
+
+import collections
+import csv
+import json
+import timeit
+
+from defs import *
+
+class FrameProfiler:
+	""" Keeps timings of the last _history_ frames in a ring buffer.
+	Frame is split into phases by marks: every mark ends a phase started by the previous one. """
+
+	enabled = True
+
+	def __init__(self, history=PROFILE_HISTORY):
+		self.frames = collections.deque(maxlen=history)
+		self.phases = None
+		self.last_time = None
+		self.frame_count = 0
+
+	def begin_frame(self):
+		self.phases = collections.OrderedDict()
+		self.last_time = timeit.default_timer()
+
+	def mark(self, phase):
+		""" Ends _phase_: time since the previous mark is added to it. """
+		now = timeit.default_timer()
+		self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last_time
+		self.last_time = now
+
+	def end_frame(self, objects=()):
+		""" Stores the frame with counts of live _objects_ by class. """
+		counts = collections.Counter(o.__class__.__name__ for o in objects)
+		self.frames.append((self.phases, counts))
+		self.frame_count += 1
+
+	def averages(self):
+		""" Returns list of (phase, average ms) over the stored frames in order of phases,
+		and dict of average object counts by class. """
+		phases = collections.OrderedDict()
+		counts = collections.Counter()
+		for frame_phases, frame_counts in self.frames:
+			for phase, sec in frame_phases.items():
+				phases[phase] = phases.get(phase, 0.0) + sec
+			counts.update(frame_counts)
+		frame_count = max(1, len(self.frames))
+		return ([(phase, sec * 1000 / frame_count) for phase, sec in phases.items()],
+				dict((name, float(count) / frame_count) for name, count in counts.items()))
+
+	def dump(self, path):
+		""" Writes stored frames to _path_: JSON if it ends with .json, CSV otherwise.
+		Times are in ms, there is a column (key) for every phase and every class of objects. """
+		first_frame = self.frame_count - len(self.frames)
+		if path.endswith(".json"):
+			frames = [{"frame": first_frame + i,
+					"phases": dict((phase, sec * 1000) for phase, sec in phases.items()),
+					"objects": dict(counts)}
+					for i, (phases, counts) in enumerate(self.frames)]
+			with open(path, "w") as stream:
+				json.dump(frames, stream, indent=1)
+			return
+
+		phase_names, class_names = [], set()
+		for phases, counts in self.frames:
+			phase_names.extend(phase for phase in phases if phase not in phase_names)
+			class_names.update(counts)
+		class_names = sorted(class_names)
+		with open(path, "w") as stream:
+			writer = csv.writer(stream)
+			writer.writerow(["frame"] + ["%s ms" % phase for phase in phase_names] + class_names)
+			for i, (phases, counts) in enumerate(self.frames):
+				writer.writerow([first_frame + i] + ["%.3f" % (phases.get(phase, 0.0) * 1000) for phase in phase_names] +
+						[counts[name] for name in class_names])
+
+class NullProfiler:
+	""" Profiler which does nothing, so instrumented code costs a few empty calls when profiling is off. """
+
+	enabled = False
+
+	def begin_frame(self):
+		pass
+
+	def mark(self, phase):
+		pass
+
+	def end_frame(self, objects=()):
+		pass
+
+NULL_PROFILER = NullProfiler()
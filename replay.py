@@ -0,0 +1,134 @@
+# replay.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Recording of player input and its replaying, so any game could be repeated exactly.
+# Replay is a binary stream: header with seed and level flags, then frame time and pressed keys of every tick.
+# Record: python replay.py --record --pilot hunter --seed 1 game.replay
+# Replay: python replay.py game.replay
+
+import argparse
+import random
+import struct
+import time
+
+import pygame
+
+from defs import *
+import level
+import arrays
+import simulation
+
+MAGIC = "DSKYREPL"
+VERSION = 1
+HEADER = struct.Struct("<8sBqB") # magic, version, seed, flags
+FRAME = struct.Struct("<dB") # frame time in seconds, bitmask of pressed control keys
+FLAG_LAZY = 1
+FLAG_ENDLESS = 2
+
+def pack_keys(pressed_keys):
+	""" Returns bitmask of _pressed_keys_: bit i is set if simulation.CONTROL_KEYS[i] is pressed. """
+	mask = 0
+	for bit, key in enumerate(simulation.CONTROL_KEYS):
+		if key in pressed_keys:
+			mask |= 1 << bit
+	return mask
+
+def unpack_keys(mask):
+	""" Returns set of pressed keys from bitmask made by pack_keys. """
+	return set(key for bit, key in enumerate(simulation.CONTROL_KEYS) if mask & (1 << bit))
+
+def new_seed():
+	return random.randrange(2 ** 31)
+
+def create_level(view_rect, seed, lazy=False, endless=False):
+	""" Seeds global random with _seed_ and creates a level, so the same seed and input give the same game.
+	Everything else which is random (backgrounds) should use its own RNG. """
+	random.seed(seed)
+	return level.Level(view_rect, LEVEL_LENGTH, lazy=lazy, seed=seed, endless=endless)
+
+class Recorder:
+	""" Writes a game to binary _stream_ tick by tick. """
+
+	def __init__(self, stream, seed, lazy=False, endless=False):
+		""" Writes header: _seed_ the level is created with (see create_level) and level flags. """
+		self.stream = stream
+		self.frames = 0
+		flags = (FLAG_LAZY if lazy else 0) | (FLAG_ENDLESS if endless else 0)
+		stream.write(HEADER.pack(MAGIC, VERSION, seed, flags))
+
+	def record(self, sec, pressed_keys):
+		""" Writes a tick of _sec_ seconds with _pressed_keys_ passed to Simulation.control before it. """
+		self.stream.write(FRAME.pack(sec, pack_keys(pressed_keys)))
+		self.frames += 1
+
+class Replay:
+	""" Game read from binary _stream_ written by Recorder: seed, level flags and list of (sec, pressed_keys). """
+
+	def __init__(self, stream):
+		header = stream.read(HEADER.size)
+		if len(header) < HEADER.size:
+			raise ValueError("replay is too short")
+		magic, version, self.seed, flags = HEADER.unpack(header)
+		if magic != MAGIC:
+			raise ValueError("not a replay")
+		if version != VERSION:
+			raise ValueError("unsupported replay version %d" % version)
+		self.lazy = bool(flags & FLAG_LAZY)
+		self.endless = bool(flags & FLAG_ENDLESS)
+
+		data = stream.read()
+		key_sets = {}
+		self.frames = []
+		for offset in xrange(0, len(data) - FRAME.size + 1, FRAME.size):
+			sec, mask = FRAME.unpack_from(data, offset)
+			if mask not in key_sets:
+				key_sets[mask] = unpack_keys(mask)
+			self.frames.append((sec, key_sets[mask]))
+
+	def create_level(self, view_rect):
+		return create_level(view_rect, self.seed, self.lazy, self.endless)
+
+def run_replay(sim, game_replay):
+	""" Feeds every recorded tick of _game_replay_ to _sim_ as fast as possible.
+	Ticks after the game is over are replayed as well, as they were played. Returns number of ticks. """
+	for sec, pressed_keys in game_replay.frames:
+		sim.control(pressed_keys)
+		sim.update(sec)
+	return len(game_replay.frames)
+
+def main():
+	parser = argparse.ArgumentParser(description="Replays recorded game without display as fast as possible, or records a game played by a pilot.")
+	parser.add_argument("file", help="replay file")
+	parser.add_argument("--arrays", action="store_true", help="keep bullets in NumPy arrays")
+	parser.add_argument("--record", action="store_true", help="record a game played by a pilot instead of replaying")
+	parser.add_argument("--pilot", choices=sorted(simulation.PILOTS), default="hunter", help="who controls the player while recording")
+	parser.add_argument("--frames", type=int, default=10000, help="max number of ticks to record")
+	parser.add_argument("--sec", type=float, default=simulation.HEADLESS_FRAME_TIME, help="frame time in seconds to record")
+	parser.add_argument("--seed", type=int, default=None, help="seed to record")
+	parser.add_argument("--lazy", action="store_true", help="record lazy level")
+	parser.add_argument("--endless", action="store_true", help="record endless level")
+	args = parser.parse_args()
+	if args.arrays and not arrays.is_available():
+		parser.error("--arrays requires NumPy")
+
+	view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+	start = time.time()
+	if args.record:
+		seed = args.seed if args.seed is not None else new_seed()
+		with open(args.file, "wb") as stream:
+			recorder = Recorder(stream, seed, args.lazy, args.endless)
+			sim = simulation.Simulation(create_level(view_rect, seed, args.lazy, args.endless), view_rect, args.arrays)
+			ticks = simulation.run_headless(sim, args.sec, args.frames, simulation.PILOTS[args.pilot], recorder)
+	else:
+		with open(args.file, "rb") as stream:
+			game_replay = Replay(stream)
+		seed = game_replay.seed
+		sim = simulation.Simulation(game_replay.create_level(view_rect), view_rect, args.arrays)
+		ticks = run_replay(sim, game_replay)
+	elapsed = max(time.time() - start, 1e-6)
+	print("seed: %d, ticks: %d, simulated: %.1f sec, real: %.2f sec, ticks per sec: %.0f" % (seed, ticks, sim.time, elapsed, ticks / elapsed))
+	simulation.report(sim)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,261 @@
+# simulation.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Game rules for a single tick without any display, so the game could run headless.
+# Run: python simulation.py --frames 10000 --seed 1
+
+import argparse
+import random
+import time
+
+import pygame
+
+from defs import *
+import objects
+import collision
+import level
+import arrays
+import profiler
+
+CONTROL_KEYS = [pygame.K_UP, pygame.K_DOWN, pygame.K_RIGHT, pygame.K_LEFT, pygame.K_SPACE]
+HEADLESS_FRAME_TIME = 1.0 / 60 # seconds
+
+class Simulation:
+	""" Runs level with all its objects tick by tick. Knows nothing about display. """
+
+	def __init__(self, current_level, view_rect, use_arrays=False, frame_profiler=profiler.NULL_PROFILER, batch_ai=False):
+		""" With _use_arrays_ bullets are kept, collided, moved and culled in arrays instead of level objects (requires NumPy).
+		Phases of update are marked in _frame_profiler_ (see profiler.FrameProfiler).
+		With _batch_ai_ tempers of enemy formations are updated all at once (requires NumPy, see arrays.update_tempers). """
+		self.level = current_level
+		self.view_rect = view_rect
+		# View borders, so visibility tests don't query the Rect every time.
+		self.view_left, self.view_top, self.view_right, self.view_bottom = view_rect.left, view_rect.top, view_rect.right, view_rect.bottom
+		self.projectiles = arrays.ProjectileStore() if use_arrays else None
+		self.batch_ai = batch_ai
+		self.collision_table = collision.CollisionTable(objects.LEVEL_CLASSES)
+		self.profiler = frame_profiler
+		self.time = 0.0
+		self.killed = 0
+		self.leaked = 0
+
+	def control(self, pressed_keys):
+		""" Passes _pressed_keys_ (set of pygame key codes) to the player controller.
+		Player cannot move beyond view borders. """
+		player = self.level.player
+		left, top, right, bottom = player.get_box()
+		if pygame.K_UP in pressed_keys:
+			if top > self.view_top:
+				player.controller.press_up()
+		if pygame.K_DOWN in pressed_keys:
+			if bottom < self.view_bottom:
+				player.controller.press_down()
+		if pygame.K_RIGHT in pressed_keys:
+			if right < self.view_right:
+				player.controller.press_right()
+		if pygame.K_LEFT in pressed_keys:
+			if left > self.view_left:
+				player.controller.press_left()
+		if pygame.K_SPACE in pressed_keys:
+			player.controller.press_shoot()
+
+	def sort_out(self, o, kept, dead, gone):
+		""" Appends _o_ to _kept_ if it is alive and visible, otherwise to _dead_ or _gone_.
+		Returns 1 if _o_ is an alive enemy gone past bottom border, 0 otherwise. """
+		if not o.is_alive():
+			dead.append(o)
+			return 0
+		# Same test as view_rect.colliderect(o.get_rect()), without building a Rect.
+		left, top, right, bottom = o.get_box()
+		if left < self.view_right and top < self.view_bottom and right > self.view_left and bottom > self.view_top:
+			kept.append(o)
+		else:
+			gone.append(o)
+		return 1 if bottom > self.view_bottom and isinstance(o, objects.EnemyShip) else 0
+
+	def update(self, sec):
+		""" Updates level for _sec_ seconds: spawns, collides and moves objects,
+		removes dead and gone ones. Enemy gone past bottom border kills player.
+		Objects are updated and sorted out in a single pass, created objects go before the old ones. """
+		current_level = self.level
+		current_level.update(sec)
+		current_level.update_formations(sec, self.batch_ai)
+		self.time += sec
+		self.profiler.mark("level")
+
+		collidees = collision.find_collisions(current_level.objects, self.collision_table)
+		if self.projectiles:
+			self.projectiles.collide(current_level.objects, collidees, self.collision_table)
+		self.profiler.mark("collide")
+		created_objects = []
+		for o, others in zip(current_level.objects, collidees):
+			if others:
+				created_objects.extend(o.collide(others))
+		gone_bullets = []
+		if self.projectiles:
+			# Stored bullets don't affect updates of others, so they are moved and culled before the updates.
+			self.projectiles.move(sec)
+			gone_bullets = self.projectiles.cull((self.view_left, self.view_top, self.view_right, self.view_bottom))
+
+		# Object can't be affected by updates of others, so it is sorted out right after its own update.
+		# Player is killed by leaked enemies only after that, as it has been sorted out already.
+		kept, dead, gone = [], [], []
+		leaked = 0
+		for o in current_level.objects:
+			o.last_pos = o.pos
+			created_objects.extend(o.update(sec))
+			leaked += self.sort_out(o, kept, dead, gone)
+		self.profiler.mark("update")
+
+		kept_created, dead_created, gone_created = [], [], []
+		for o in created_objects:
+			leaked += self.sort_out(o, kept_created, dead_created, gone_created)
+		if self.projectiles:
+			self.projectiles.add([o for o in kept_created if isinstance(o, objects.Bullet)])
+			kept_created = [o for o in kept_created if not isinstance(o, objects.Bullet)]
+		kept_created.extend(kept)
+		current_level.objects = kept_created
+		if leaked:
+			self.leaked += leaked
+			current_level.player.health = 0
+
+		dead_created.extend(dead)
+		for o in dead_created:
+			if isinstance(o, objects.EnemyShip):
+				self.killed += 1
+			objects.release(o)
+		for o in gone_created:
+			objects.release(o)
+		for o in gone:
+			objects.release(o)
+		for o in gone_bullets:
+			objects.release(o)
+		self.profiler.mark("filter")
+
+	def get_objects(self):
+		""" Returns list of all live objects: level objects and stored bullets with their positions written back. """
+		if self.projectiles:
+			return self.level.objects + self.projectiles.sync()
+		return self.level.objects
+
+	def count_objects(self):
+		""" Returns number of all live objects without building the list of them. """
+		return len(self.level.objects) + (self.projectiles.count if self.projectiles else 0)
+
+	def is_over(self):
+		return not self.level.player.is_alive() or self.level.is_ended_up()
+
+def idle_pilot(sim):
+	""" Pilot which doesn't touch anything. """
+	return set()
+
+def gunner_pilot(sim):
+	""" Pilot which stays still and keeps shooting. """
+	return set([pygame.K_SPACE])
+
+def hunter_pilot(sim):
+	""" Pilot which keeps shooting and follows the lowest enemy on screen along the bottom of the view. """
+	pressed_keys = set([pygame.K_SPACE])
+	player = sim.level.player
+	enemies = [o for o in sim.level.objects if isinstance(o, objects.EnemyShip)]
+	target_x = sim.view_rect.centerx
+	if enemies:
+		target_x = max(enemies, key=lambda o: o.pos[1]).pos[0]
+	if player.pos[0] < target_x - player.radius / 2:
+		pressed_keys.add(pygame.K_RIGHT)
+	elif player.pos[0] > target_x + player.radius / 2:
+		pressed_keys.add(pygame.K_LEFT)
+	if player.pos[1] < sim.view_rect.bottom - player.radius * 3:
+		pressed_keys.add(pygame.K_DOWN)
+	return pressed_keys
+
+PILOTS = {"idle": idle_pilot, "gunner": gunner_pilot, "hunter": hunter_pilot}
+
+def run_headless(sim, sec, frames, pilot=idle_pilot, recorder=None):
+	""" Runs _sim_ for at most _frames_ ticks of fixed _sec_ seconds or until game is over.
+	_pilot_ is a function which returns pressed keys for the current state of simulation.
+	Every tick is written to _recorder_ (see replay.Recorder) if there is one.
+	Returns number of simulated ticks. """
+	ticks = 0
+	while ticks < frames and not sim.is_over():
+		pressed_keys = pilot(sim)
+		if recorder: recorder.record(sec, pressed_keys)
+		sim.control(pressed_keys)
+		sim.update(sec)
+		ticks += 1
+	return ticks
+
+def get_state(sim):
+	""" Returns hash of everything that tells one state of simulation from another.
+	Order of objects doesn't count, so games with bullets in arrays and in objects have the same states. """
+	return hash((sim.killed, sim.leaked, sim.level.player.health, sim.level.player.weapon_level,
+			tuple(sorted((o.__class__.__name__, o.pos) for o in sim.get_objects()))))
+
+def check_batch_ai(seed, sec, frames, pilot=idle_pilot, lazy=False, endless=False):
+	""" Differential test of batched AI: plays the same game with per-object and batched AI
+	and compares state after every tick. Returns number of the first tick which differs, or None. """
+	runs = []
+	for batch_ai in (False, True):
+		random.seed(seed)
+		view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+		current_level = level.Level(view_rect, LEVEL_LENGTH, lazy=lazy, seed=seed, endless=endless)
+		sim = Simulation(current_level, view_rect, batch_ai=batch_ai)
+		states = []
+		while len(states) < frames and not sim.is_over():
+			sim.control(pilot(sim))
+			sim.update(sec)
+			states.append(get_state(sim))
+		runs.append(states)
+	per_object, batched = runs
+	for tick, (state, batched_state) in enumerate(zip(per_object, batched)):
+		if state != batched_state:
+			return tick
+	if len(per_object) != len(batched):
+		return min(len(per_object), len(batched))
+	return None
+
+def report(sim):
+	""" Prints outcome of the game and pool statistics. """
+	print("player alive: %s, level ended: %s, killed: %d, leaked: %d, objects left: %d" % (sim.level.player.is_alive(), sim.level.is_ended_up(), sim.killed, sim.leaked, sim.count_objects()))
+	for name, (hits, misses) in sorted(objects.pool_stats().items()):
+		print("pool %s: %d hits, %d misses" % (name, hits, misses))
+
+def main():
+	parser = argparse.ArgumentParser(description="Runs level without display with fixed frame time.")
+	parser.add_argument("--frames", type=int, default=10000, help="max number of ticks to simulate")
+	parser.add_argument("--sec", type=float, default=HEADLESS_FRAME_TIME, help="frame time in seconds")
+	parser.add_argument("--seed", type=int, default=None, help="seed for level generation")
+	parser.add_argument("--pilot", choices=sorted(PILOTS), default="idle", help="who controls the player")
+	parser.add_argument("--arrays", action="store_true", help="keep bullets in NumPy arrays")
+	parser.add_argument("--lazy", action="store_true", help="generate enemies only when they are close to appear")
+	parser.add_argument("--endless", action="store_true", help="lazy level which never ends")
+	parser.add_argument("--batch-ai", action="store_true", help="update tempers of enemy formations all at once in NumPy arrays")
+	parser.add_argument("--check-ai", action="store_true", help="check that batched AI plays exactly the same game as per-object one")
+	args = parser.parse_args()
+	if (args.arrays or args.batch_ai or args.check_ai) and not arrays.is_available():
+		parser.error("--arrays, --batch-ai and --check-ai require NumPy")
+
+	if args.check_ai:
+		seed = args.seed if args.seed is not None else random.randrange(2 ** 31)
+		tick = check_batch_ai(seed, args.sec, args.frames, PILOTS[args.pilot], args.lazy, args.endless)
+		if tick is None:
+			print("seed %d: batched AI plays the same game" % seed)
+		else:
+			print("seed %d: batched AI differs at tick %d" % (seed, tick))
+		return
+
+	random.seed(args.seed)
+	view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+	current_level = level.Level(view_rect, LEVEL_LENGTH, lazy=args.lazy, seed=args.seed, endless=args.endless)
+	sim = Simulation(current_level, view_rect, args.arrays, batch_ai=args.batch_ai)
+	pilot = PILOTS[args.pilot]
+
+	start = time.time()
+	ticks = run_headless(sim, args.sec, args.frames, pilot)
+	elapsed = max(time.time() - start, 1e-6)
+	print("ticks: %d, simulated: %.1f sec, real: %.2f sec, ticks per sec: %.0f" % (ticks, ticks * args.sec, elapsed, ticks / elapsed))
+	report(sim)
+
+if __name__ == "__main__":
+	main()
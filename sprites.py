@@ -3,12 +3,17 @@
 # license WTFPLv2
 #
 # Contains sprites and procedures for their generation.
+# Generated sprites can be kept between launches in the directory set by DEADSKY_SPRITE_CACHE environment variable.
 
 import pygame
 import random
 import math
+import os
+import json
+import hashlib
 
 from defs import *
+import variants
 
 DIGIT_PATTERN_SIZE = (3, 4)
 digit_patterns = { False: [(0, 0), (1, 0), (2, 0), (0, 1), (2, 1), (0, 2), (2, 2), (0, 3), (1, 3), (2, 3)],
@@ -68,7 +73,9 @@ def player_sprite():
 
 	return sprite
 
-def explode_sprite():
+def explode_sprite(rng=random, spread=1.0, brightness=1.0):
+	""" Cloud of gray digits. _rng_ is a source of randomness (random module itself or random.Random).
+	_spread_ is a part of sprite radius the cloud takes, _brightness_ scales colors of digits. """
 	sprite_size = 24
 
 	sprite = pygame.Surface((sprite_size, sprite_size), pygame.HWSURFACE)
@@ -81,12 +88,12 @@ def explode_sprite():
 
 	digits = []
 	for i in range(digit_count):
-		x = random.randrange(sprite_size - DIGIT_PATTERN_SIZE[0])
-		y = random.randrange(sprite_size - DIGIT_PATTERN_SIZE[1])
-		if math.hypot(x - half_size, y - half_size) > half_size:
+		x = rng.randrange(sprite_size - DIGIT_PATTERN_SIZE[0])
+		y = rng.randrange(sprite_size - DIGIT_PATTERN_SIZE[1])
+		if math.hypot(x - half_size, y - half_size) > half_size * spread:
 			continue
-		r = random.randrange(128)
-		pattern = (random.randrange(2) == 0)
+		r = int(rng.randrange(128) * brightness)
+		pattern = (rng.randrange(2) == 0)
 		digits.append((x, y, r, pattern))
 
 	digits.sort(lambda x, y: -1 if x[2] < y[2] else (1 if x[2] > y[2] else 0))
@@ -254,14 +261,108 @@ def weapon_bonus_sprite():
 
 	return sprite
 
-PLAYER_SPRITE        = pygame.transform.scale(player_sprite(),        (PLAYER_SIZE * 2,  PLAYER_SIZE * 2))
-PLAYER_BULLET_SPRITE = pygame.transform.scale(player_bullet_sprite(), (BULLET_SIZE * 2,  BULLET_SIZE * 2))
-ENEMY_BULLET_SPRITE  = pygame.transform.scale(enemy_bullet_sprite(),  (BULLET_SIZE * 2,  BULLET_SIZE * 2))
-ENEMY_SPRITE         = pygame.transform.scale(enemy_sprite(),         (ENEMY_SIZE * 2,   ENEMY_SIZE * 2))
-EXPLODE_SPRITE       = pygame.transform.scale(explode_sprite(),       (EXPLODE_SIZE * 2, EXPLODE_SIZE * 2))
-HEALTH_BONUS_SPRITE  = pygame.transform.scale(health_bonus_sprite(),  (BONUS_SIZE * 2,   BONUS_SIZE * 2))
-WEAPON_BONUS_SPRITE  = pygame.transform.scale(weapon_bonus_sprite(),  (BONUS_SIZE * 2,   BONUS_SIZE * 2))
+def generate_sprites():
+	""" Generates all sprites scaled to the sizes of objects. Returns dict: name -> sprite. """
+	named_sprites = {
+			"player":        pygame.transform.scale(player_sprite(),        (PLAYER_SIZE * 2,  PLAYER_SIZE * 2)),
+			"player_bullet": pygame.transform.scale(player_bullet_sprite(), (BULLET_SIZE * 2,  BULLET_SIZE * 2)),
+			"enemy_bullet":  pygame.transform.scale(enemy_bullet_sprite(),  (BULLET_SIZE * 2,  BULLET_SIZE * 2)),
+			"enemy":         pygame.transform.scale(enemy_sprite(),         (ENEMY_SIZE * 2,   ENEMY_SIZE * 2)),
+			"health_bonus":  pygame.transform.scale(health_bonus_sprite(),  (BONUS_SIZE * 2,   BONUS_SIZE * 2)),
+			"weapon_bonus":  pygame.transform.scale(weapon_bonus_sprite(),  (BONUS_SIZE * 2,   BONUS_SIZE * 2))
+			}
+	for digit in digit_patterns:
+		named_sprites["digit_%s" % digit] = pygame.transform.scale(digit_sprite(digit), (DIGIT_PATTERN_SIZE[0] * 2, DIGIT_PATTERN_SIZE[0] * 2))
+	for variant in xrange(EXPLODE_VARIANTS):
+		for frame in xrange(EXPLODE_FRAMES):
+			# Explode grows and fades out; every frame has its own seed, so the cloud boils.
+			progress = float(frame) / EXPLODE_FRAMES
+			rng = random.Random(variant * EXPLODE_FRAMES + frame)
+			sprite = explode_sprite(rng, 0.6 + 0.4 * progress, 1.0 - 0.75 * progress)
+			named_sprites["explode_%d_%d" % (variant, frame)] = pygame.transform.scale(sprite, (EXPLODE_SIZE * 2, EXPLODE_SIZE * 2))
+	return named_sprites
+
+SPRITE_CACHE_VARIABLE = "DEADSKY_SPRITE_CACHE"
+SPRITE_GENERATION = 1 # should be increased with every change of generators, so sprites cached before are not used
+
+def get_cache_key():
+	""" Hash of everything sprites depend on: sizes and colors from defs, digit patterns and SPRITE_GENERATION. """
+	params = [SPRITE_GENERATION, PLAYER_SIZE, BULLET_SIZE, ENEMY_SIZE, EXPLODE_SIZE, BONUS_SIZE, STAR_COLOR, DIGIT_PATTERN_SIZE,
+			sorted(digit_patterns.items()), EXPLODE_VARIANTS, EXPLODE_FRAMES]
+	return hashlib.md5(repr(params)).hexdigest()
+
+def save_sprites(path, named_sprites):
+	""" Writes raw pixels of all sprites into one buffer file _path_.bin and their names and sizes into manifest _path_.json. """
+	manifest = []
+	with open(path + ".bin", "wb") as f:
+		for name in sorted(named_sprites):
+			pixels = pygame.image.tostring(named_sprites[name], "RGB")
+			manifest.append({"name": name, "size": named_sprites[name].get_size(), "length": len(pixels)})
+			f.write(pixels)
+	with open(path + ".json", "w") as f:
+		json.dump(manifest, f)
+
+def load_cached_sprites(path):
+	""" Reads sprites written by save_sprites. """
+	with open(path + ".json") as f:
+		manifest = json.load(f)
+	with open(path + ".bin", "rb") as f:
+		pixels = f.read()
+	named_sprites = {}
+	offset = 0
+	for entry in manifest:
+		length = entry["length"]
+		sprite = pygame.image.fromstring(pixels[offset:offset + length], tuple(entry["size"]), "RGB")
+		sprite.set_colorkey((255, 0, 255))
+		named_sprites[str(entry["name"])] = sprite
+		offset += length
+	return named_sprites
+
+def load_sprites(cache_dir=None):
+	""" Generates sprites, or loads them from _cache_dir_ if there is one and writes them there if they are not cached yet.
+	Cache is not required: any failure to read it leads to generation. Returns dict: name -> sprite. """
+	if not cache_dir:
+		return generate_sprites()
+	path = os.path.join(cache_dir, "sprites-" + get_cache_key())
+	try:
+		return load_cached_sprites(path)
+	except (IOError, OSError, ValueError, KeyError):
+		pass
+	named_sprites = generate_sprites()
+	try:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		save_sprites(path, named_sprites)
+	except (IOError, OSError):
+		pass
+	return named_sprites
+
+def set_sprites(named_sprites):
+	""" Makes _named_sprites_ the current sprites of the game. """
+	global SPRITES, PLAYER_SPRITE, PLAYER_BULLET_SPRITE, ENEMY_BULLET_SPRITE, ENEMY_SPRITE, EXPLODE_SPRITE, HEALTH_BONUS_SPRITE, WEAPON_BONUS_SPRITE
+	SPRITES = named_sprites
+	PLAYER_SPRITE        = named_sprites["player"]
+	PLAYER_BULLET_SPRITE = named_sprites["player_bullet"]
+	ENEMY_BULLET_SPRITE  = named_sprites["enemy_bullet"]
+	ENEMY_SPRITE         = named_sprites["enemy"]
+	HEALTH_BONUS_SPRITE  = named_sprites["health_bonus"]
+	WEAPON_BONUS_SPRITE  = named_sprites["weapon_bonus"]
+	for digit in digit_patterns:
+		DIGIT_SPRITE[digit] = named_sprites["digit_%s" % digit]
+	EXPLODE_ANIMATIONS[:] = [[named_sprites["explode_%d_%d" % (variant, frame)] for frame in xrange(EXPLODE_FRAMES)]
+			for variant in xrange(EXPLODE_VARIANTS)]
+	EXPLODE_SPRITE = EXPLODE_ANIMATIONS[0][0]
 
 DIGIT_SPRITE = {}
-for digit in digit_patterns:
-	DIGIT_SPRITE[digit] = pygame.transform.scale(digit_sprite(digit), (DIGIT_PATTERN_SIZE[0] * 2, DIGIT_PATTERN_SIZE[0] * 2))
+# Frames of every explode variant, shared by all explodes.
+EXPLODE_ANIMATIONS = []
+set_sprites(load_sprites(os.environ.get(SPRITE_CACHE_VARIABLE)))
+
+VARIANTS = None
+
+def use_display_format():
+	""" Replaces all sprites with their copies in display format, which are kept in VARIANTS.
+	Should be called after display mode is set and before any object is created. """
+	global VARIANTS
+	VARIANTS = variants.VariantCache(SPRITES)
+	set_sprites(dict((name, VARIANTS.get(name)) for name in SPRITES))
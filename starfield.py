@@ -0,0 +1,94 @@
+# starfield.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Background with stars pre-rendered into cached layers which just scroll down,
+# so drawing takes constant number of blits whatever the number of stars is.
+
+import random
+import math
+
+import pygame
+
+from defs import *
+import sprites
+
+STRIP_HEIGHT = 64 # pixels
+
+class StarLayer:
+	""" Stars rendered once onto a surface taller than the screen, which scrolls down and wraps around.
+	Layer consists of horizontal strips; there is always a strip out of view,
+	and stars are respawned only in the strip that has wrapped around and gone out of view. """
+
+	def __init__(self, size, count, speed, opaque=True, rng=random):
+		""" Creates a layer for screen with _size_ with _count_ of stars moving with _speed_ pixels per sec.
+		Non-opaque layer lets layers below to be seen through. _rng_ is a source of randomness. """
+		self.width, self.height = size
+		self.rng = rng
+		self.speed = speed
+		self.strip_count = int(math.ceil(float(self.height) / STRIP_HEIGHT)) + 2
+		self.layer_height = self.strip_count * STRIP_HEIGHT
+		self.stars_per_strip = count * STRIP_HEIGHT / self.height
+		self.offset = 0.0
+
+		self.surface = pygame.Surface((self.width, self.layer_height))
+		if not opaque:
+			self.surface.set_colorkey(BACK_COLOR)
+		for strip in xrange(self.strip_count):
+			self.respawn_strip(strip)
+		self.hidden_strips = set(self.get_hidden_strips())
+
+	def respawn_strip(self, strip):
+		""" Clears _strip_ and puts new stars on it. """
+		top = strip * STRIP_HEIGHT
+		self.surface.fill(BACK_COLOR, pygame.Rect(0, top, self.width, STRIP_HEIGHT))
+		for i in xrange(self.stars_per_strip):
+			pattern = (self.rng.randrange(2) == 0)
+			star = sprites.DIGIT_SPRITE[pattern]
+			x = self.rng.randrange(self.width)
+			y = top + self.rng.randrange(STRIP_HEIGHT - star.get_height() + 1)
+			self.surface.blit(star, (x, y))
+
+	def get_hidden_strips(self):
+		""" Returns strips which are entirely out of view at the moment. """
+		offset = int(self.offset)
+		for strip in xrange(self.strip_count):
+			top = (strip * STRIP_HEIGHT + offset) % self.layer_height
+			if top >= self.height and top + STRIP_HEIGHT <= self.layer_height:
+				yield strip
+
+	def move_down(self, amount):
+		""" Scrolls layer down with _amount_ of pixels and respawns stars on strips which just went out of view. """
+		self.offset = (self.offset + amount) % self.layer_height
+		hidden_strips = set(self.get_hidden_strips())
+		for strip in hidden_strips - self.hidden_strips:
+			self.respawn_strip(strip)
+		self.hidden_strips = hidden_strips
+
+	def update(self, sec):
+		self.move_down(self.speed * sec)
+
+	def draw(self, screen):
+		""" Draws layer with at most two blits: the wrapped bottom part goes on top of the screen. """
+		offset = int(self.offset)
+		screen.blit(self.surface, (0, 0), pygame.Rect(0, self.layer_height - offset, self.width, offset))
+		if offset < self.height:
+			screen.blit(self.surface, (0, offset), pygame.Rect(0, 0, self.width, self.height - offset))
+
+class Starfield:
+	""" Background of several star layers, far ones are moving slower (parallax). """
+
+	def __init__(self, size, count, layer_count=1, rng=random):
+		""" Creates a background for screen with _size_ and spreads _count_ of stars over _layer_count_ layers. """
+		self.layers = [StarLayer(size, count / layer_count, LEVEL_SPEED * (i + 1.0) / layer_count, opaque=(i == 0), rng=rng)
+				for i in xrange(layer_count)]
+
+	def update(self, sec):
+		""" Updates background for _sec_ seconds after the last call. """
+		for layer in self.layers:
+			layer.update(sec)
+
+	def draw(self, screen):
+		""" Covers the whole screen, so there is no need to clear it before. """
+		for layer in self.layers:
+			layer.draw(screen)
@@ -0,0 +1,195 @@
+# stress.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Stress scenarios for scaling tests: synthetic endless levels with many times the normal enemy density
+# and fire rate, played by a player with max weapon who never dies, so the load only grows.
+# Time of every tick is binned by the number of live objects into a stress curve,
+# which shows where the loop stops keeping up with the tick rate.
+# Run: python stress.py --density 1,10,100 --fire-rate 4 --render --output stress.csv
+
+import argparse
+import csv
+import json
+import random
+import timeit
+
+import pygame
+
+from defs import *
+import sprites
+import level
+import arrays
+import simulation
+import painter
+
+STRESS_DENSITIES = [1.0, 2.0, 5.0, 10.0]
+STRESS_FRAMES = 600
+BIN_SIZE = 100 # objects
+
+class StressLevel(level.Level):
+	""" Endless level with _density_ times more enemy groups than a normal one, which fire _fire_rate_ times faster.
+	Every formation shoots, so silent groups don't take the load off. Player starts with _weapon_level_
+	and reloads in _player_reload_ seconds. """
+
+	def __init__(self, view_rect, density=1.0, fire_rate=1.0, weapon_level=MAX_WEAPON_LEVEL, player_reload=PLAYER_RELOAD_TIME, seed=None):
+		# Base constructor enqueues the first segments already.
+		self.fire_rate = fire_rate
+		group_count = max(1, int(round(ENEMY_GROUP_COUNT * density)))
+		level.Level.__init__(self, view_rect, LEVEL_LENGTH, group_count, seed=seed, endless=True)
+		# Skip the empty sky before the first segment, so enemies start coming right away.
+		self.length = LEVEL_LENGTH - view_rect.height
+		self.player.weapon_level = weapon_level
+		self.player.reload_delay = player_reload
+
+	def enqueue(self, enemies):
+		# Group never spans segments, so every formation is seen here only once.
+		for formation in set(enemy.controller for enemy in enemies):
+			formation.shoot_temper.group_delay /= self.fire_rate
+			formation.shoot_temper.group_count = max(1, formation.shoot_temper.group_count)
+		for enemy in enemies:
+			enemy.reload_delay /= self.fire_rate
+		level.Level.enqueue(self, enemies)
+
+class Scene:
+	""" Everything needed to paint ticks the way the game does: screen, painter and background of _star_count_ stars,
+	which are kept in arrays with _use_arrays_. """
+
+	def __init__(self, screen, star_count, seed=None, use_arrays=False):
+		self.screen = screen
+		self.painter = painter.Painter()
+		background_class = arrays.ArrayBackground if use_arrays else level.Background
+		self.background = background_class(screen.get_size(), star_count, random.Random(seed))
+
+	def paint(self, sim, sec):
+		self.background.update(sec)
+		self.painter.draw_background(self.screen, self.background)
+		if sim.projectiles:
+			self.painter.draw_projectiles(self.screen, sim.projectiles)
+		for o in sim.level.objects:
+			self.painter.draw_object(self.screen, o)
+		self.painter.draw_hud(self.screen, sim, 0)
+		self.painter.present(self.screen)
+
+def run_scenario(config, frames, sec, pilot=simulation.hunter_pilot, use_arrays=False, batch_ai=False, scene=None, seed=0):
+	""" Plays StressLevel made with _config_ (dict of its keyword arguments) for _frames_ ticks of _sec_ seconds.
+	Every tick is painted on _scene_ if there is one. Returns list of (live objects, tick time in seconds). """
+	random.seed(seed)
+	view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+	current_level = StressLevel(view_rect, seed=seed, **config)
+	sim = simulation.Simulation(current_level, view_rect, use_arrays, batch_ai=batch_ai)
+	player = current_level.player
+	samples = []
+	for i in xrange(frames):
+		start = timeit.default_timer()
+		sim.control(pilot(sim))
+		sim.update(sec)
+		if scene: scene.paint(sim, sec)
+		samples.append((sim.count_objects(), timeit.default_timer() - start))
+		# Neither bullets nor leaked enemies stop the scenario.
+		player.health = player.max_health
+	return samples
+
+def stress_curve(samples, bin_size=BIN_SIZE):
+	""" Groups _samples_ of (live objects, tick time in seconds) into bins of _bin_size_ objects.
+	Returns list of dicts with times in ms, one per non-empty bin from the smallest count. """
+	bins = {}
+	for count, elapsed in samples:
+		bins.setdefault(count // bin_size * bin_size, []).append(elapsed * 1000)
+	curve = []
+	for objects_from in sorted(bins):
+		times = sorted(bins[objects_from])
+		curve.append({
+				"objects_from": objects_from,
+				"objects_to": objects_from + bin_size - 1,
+				"ticks": len(times),
+				"mean_ms": sum(times) / len(times),
+				"p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+				"max_ms": times[-1]
+				})
+	return curve
+
+def find_cliff(curve, budget_ms):
+	""" Returns the first bin of _curve_ whose mean tick time is over _budget_ms_, or None. """
+	for point in curve:
+		if point["mean_ms"] > budget_ms:
+			return point
+	return None
+
+def write_report(filename, curve, scenarios):
+	""" Writes CSV with the curve or JSON with both the curve and scenario summaries, depending on _filename_ extension. """
+	if filename.endswith(".csv"):
+		with open(filename, "wb") as f:
+			writer = csv.DictWriter(f, ["objects_from", "objects_to", "ticks", "mean_ms", "p95_ms", "max_ms"])
+			writer.writeheader()
+			writer.writerows(curve)
+	else:
+		with open(filename, "w") as f:
+			json.dump({"curve": curve, "scenarios": scenarios}, f, indent=1, sort_keys=True)
+
+def parse_floats(text):
+	""" Parses 'value1,value2,...' into list of floats. """
+	try:
+		return [float(value) for value in text.split(",")]
+	except ValueError:
+		raise argparse.ArgumentTypeError("not a list of numbers: %s" % text)
+
+def main():
+	parser = argparse.ArgumentParser(description="Plays synthetic levels of growing density and reports tick time against number of live objects.")
+	parser.add_argument("--density", type=parse_floats, default=STRESS_DENSITIES, help="value1,value2,... enemy groups per level as multiples of normal")
+	parser.add_argument("--fire-rate", type=float, default=1.0, help="enemies fire that many times faster, every group shoots")
+	parser.add_argument("--weapon-level", type=int, default=MAX_WEAPON_LEVEL, help="weapon level of the player")
+	parser.add_argument("--player-reload", type=float, default=PLAYER_RELOAD_TIME, help="seconds for player to reload")
+	parser.add_argument("--frames", type=int, default=STRESS_FRAMES, help="ticks per density")
+	parser.add_argument("--sec", type=float, default=simulation.HEADLESS_FRAME_TIME, help="frame time in seconds")
+	parser.add_argument("--seed", type=int, default=0, help="seed of level generation")
+	parser.add_argument("--pilot", choices=sorted(simulation.PILOTS), default="hunter", help="who controls the player")
+	parser.add_argument("--arrays", action="store_true", help="keep stars and bullets in NumPy arrays")
+	parser.add_argument("--batch-ai", action="store_true", help="update tempers of enemy formations all at once in NumPy arrays")
+	parser.add_argument("--render", action="store_true", help="paint every tick as the game does, on dummy display if there is no display")
+	parser.add_argument("--stars", type=int, default=STAR_COUNT, help="number of stars when rendering")
+	parser.add_argument("--bin-size", type=int, default=BIN_SIZE, help="objects per bin of the curve")
+	parser.add_argument("--output", default=None, help="report file, .csv with the curve or .json with the curve and scenarios")
+	args = parser.parse_args()
+	if (args.arrays or args.batch_ai) and not arrays.is_available():
+		parser.error("--arrays and --batch-ai require NumPy")
+	if min(args.density) <= 0 or args.fire_rate <= 0:
+		parser.error("--density and --fire-rate should be positive")
+
+	scene = None
+	if args.render:
+		screen = painter.init_display()
+		sprites.use_display_format()
+		scene = Scene(screen, args.stars, args.seed, args.arrays)
+
+	samples, scenarios = [], []
+	print("%8s %8s %12s %12s" % ("density", "ticks", "max objects", "mean ms"))
+	for density in args.density:
+		config = {"density": density, "fire_rate": args.fire_rate, "weapon_level": args.weapon_level, "player_reload": args.player_reload}
+		scenario_samples = run_scenario(config, args.frames, args.sec, simulation.PILOTS[args.pilot], args.arrays, args.batch_ai, scene, args.seed)
+		summary = dict(config)
+		summary.update({
+				"ticks": len(scenario_samples),
+				"max_objects": max(count for count, elapsed in scenario_samples),
+				"mean_ms": sum(elapsed for count, elapsed in scenario_samples) * 1000 / len(scenario_samples)
+				})
+		scenarios.append(summary)
+		samples.extend(scenario_samples)
+		print("%8g %8d %12d %12.2f" % (density, summary["ticks"], summary["max_objects"], summary["mean_ms"]))
+
+	curve = stress_curve(samples, args.bin_size)
+	print("%16s %8s %10s %10s %10s" % ("objects", "ticks", "mean ms", "p95 ms", "max ms"))
+	for point in curve:
+		print("%16s %8d %10.2f %10.2f %10.2f" % ("%d-%d" % (point["objects_from"], point["objects_to"]),
+			point["ticks"], point["mean_ms"], point["p95_ms"], point["max_ms"]))
+	budget_ms = 1000.0 / TICK_RATE
+	cliff = find_cliff(curve, budget_ms)
+	if cliff:
+		print("tick takes longer than %.1f ms from %d objects" % (budget_ms, cliff["objects_from"]))
+	else:
+		print("tick fits in %.1f ms at every number of objects" % budget_ms)
+	if args.output:
+		write_report(args.output, curve, scenarios)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,122 @@
+# sweep.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Monte-Carlo sweeps over level generation parameters: runs lots of seeded headless levels
+# on all cores and writes aggregated outcomes for every combination of parameters.
+# Run: python sweep.py --runs 20 --param PROB_HUNTER=0.1,0.5 --param ENEMY_GROUP_COUNT=20,40 --output report.csv
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import random
+
+import pygame
+
+from defs import *
+import level
+import simulation
+
+GROUP_COUNT_PARAM = "ENEMY_GROUP_COUNT"
+MAX_FRAMES = 100000
+
+def parse_param(text):
+	""" Parses 'NAME=value1,value2,...' into (NAME, [values]). """
+	name, values = text.split("=", 1)
+	if name != GROUP_COUNT_PARAM and name not in probs:
+		raise argparse.ArgumentTypeError("unknown parameter: %s" % name)
+	cast = int if name == GROUP_COUNT_PARAM else float
+	return name, [cast(value) for value in values.split(",")]
+
+def run_level(task):
+	""" Runs one headless level for _task_ (config, seed, pilot name, sec).
+	Config is a dict of overridden probs and group count.
+	Everything random is seeded from the task, so result doesn't depend on worker or order. """
+	config, seed, pilot, sec = task
+	saved_probs = dict(probs)
+	probs.update((name, value) for name, value in config.items() if name in probs)
+	try:
+		random.seed(seed)
+		view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+		current_level = level.Level(view_rect, LEVEL_LENGTH, config.get(GROUP_COUNT_PARAM, ENEMY_GROUP_COUNT))
+		sim = simulation.Simulation(current_level, view_rect)
+		simulation.run_headless(sim, sec, MAX_FRAMES, simulation.PILOTS[pilot])
+	finally:
+		probs.clear()
+		probs.update(saved_probs)
+	return {
+			"config": config,
+			"seed": seed,
+			"survival_time": sim.time,
+			"survived": current_level.player.is_alive(),
+			"killed": sim.killed,
+			"leaked": sim.leaked
+			}
+
+def aggregate(results):
+	""" Groups run results by config and returns list of summaries. """
+	groups = {}
+	for result in results:
+		key = tuple(sorted(result["config"].items()))
+		groups.setdefault(key, []).append(result)
+
+	summaries = []
+	for key in sorted(groups):
+		runs = groups[key]
+		mean = lambda field: sum(run[field] for run in runs) / float(len(runs))
+		summary = dict(key)
+		summary.update({
+			"runs": len(runs),
+			"survival_rate": mean("survived"),
+			"survival_time_mean": mean("survival_time"),
+			"survival_time_min": min(run["survival_time"] for run in runs),
+			"survival_time_max": max(run["survival_time"] for run in runs),
+			"killed_mean": mean("killed"),
+			"leaked_mean": mean("leaked")
+			})
+		summaries.append(summary)
+	return summaries
+
+def write_report(filename, summaries, results):
+	""" Writes CSV with summaries or JSON with both summaries and every run, depending on _filename_ extension. """
+	if filename.endswith(".csv"):
+		fields = sorted(set(itertools.chain(*[summary.keys() for summary in summaries])))
+		with open(filename, "wb") as f:
+			writer = csv.DictWriter(f, fields)
+			writer.writeheader()
+			writer.writerows(summaries)
+	else:
+		with open(filename, "w") as f:
+			json.dump({"summary": summaries, "runs": results}, f, indent=1, sort_keys=True)
+
+def main():
+	parser = argparse.ArgumentParser(description="Runs seeded headless levels for every combination of parameters on a process pool.")
+	parser.add_argument("--param", type=parse_param, action="append", default=[],
+			help="NAME=value1,value2,... where NAME is one of probs or " + GROUP_COUNT_PARAM)
+	parser.add_argument("--runs", type=int, default=10, help="runs per combination of parameters")
+	parser.add_argument("--seed", type=int, default=0, help="seed of the first run, others follow it")
+	parser.add_argument("--pilot", choices=sorted(simulation.PILOTS), default="hunter", help="who controls the player")
+	parser.add_argument("--sec", type=float, default=simulation.HEADLESS_FRAME_TIME, help="frame time in seconds")
+	parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="number of processes")
+	parser.add_argument("--output", default="sweep.json", help="report file, .csv or .json")
+	args = parser.parse_args()
+
+	names = [name for name, values in args.param]
+	configs = [dict(zip(names, values)) for values in itertools.product(*[values for name, values in args.param])]
+	tasks = [(config, args.seed + run, args.pilot, args.sec) for config in configs for run in xrange(args.runs)]
+
+	pool = multiprocessing.Pool(args.workers)
+	try:
+		results = pool.map(run_level, tasks)
+	finally:
+		pool.close()
+		pool.join()
+
+	summaries = aggregate(results)
+	write_report(args.output, summaries, results)
+	print("%d runs in %d configs, report: %s" % (len(results), len(configs), args.output))
+
+if __name__ == "__main__":
+	main()
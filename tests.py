@@ -0,0 +1,463 @@
+# tests.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Behaviour checks for the engine: formations, collisions, pools, replays, sprite cache.
+# Run: python -m unittest tests
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import io
+import random
+import shutil
+import tempfile
+import unittest
+
+import pygame
+
+from defs import *
+import controller
+import objects
+import pool
+import collision
+import arrays
+import simulation
+import level
+import replay
+import sprites
+import variants
+import starfield
+import painter
+
+TICK = 1.0 / 60
+
+def new_enemy(pos):
+	ai = controller.EnemyController(controller.ShootTemper(0.0, 0), controller.PawnMoveTemper())
+	return objects.EnemyShip(None, pos, ENEMY_SIZE, ai, ENEMY_RELOAD_TIME)
+
+def random_objects(rng, count):
+	""" Creates player and _count_ of objects of every level class scattered over the screen.
+	Objects have moved since the last tick, bullets for up to a few sizes of a ship. """
+	random_pos = lambda: (rng.uniform(0, SCREEN_SIZE[0]), rng.uniform(0, SCREEN_SIZE[1]))
+	builders = [
+			lambda pos: new_enemy(pos),
+			lambda pos: objects.PlayerBullet(None, pos, BULLET_SIZE, PLAYER_BULLET_VELOCITY),
+			lambda pos: objects.EnemyBullet(None, pos, BULLET_SIZE, ENEMY_BULLET_VELOCITY),
+			lambda pos: objects.HealthBonus(None, pos, BONUS_SIZE),
+			lambda pos: objects.WeaponBonus(None, pos, BONUS_SIZE),
+			lambda pos: objects.Explode([None], pos, EXPLODE_SIZE, EXPLODE_DELAY)
+			]
+	objs = [objects.PlayerShip(None, random_pos(), PLAYER_SIZE, controller.PlayerController(), PLAYER_RELOAD_TIME, PLAYER_HEALTH)]
+	objs += [rng.choice(builders)(random_pos()) for i in xrange(count)]
+	for o in objs:
+		reach = ENEMY_SIZE * 6 if isinstance(o, objects.Bullet) else ENEMY_SIZE
+		o.last_pos = (o.pos[0] + rng.uniform(-reach, reach), o.pos[1] + rng.uniform(-reach, reach))
+	return objs
+
+def play_states(seed, pilot, frames, **options):
+	""" Plays seeded level with _pilot_ for at most _frames_ ticks. Returns list of states (see simulation.get_state) after every tick.
+	_options_ are passed to Simulation. """
+	random.seed(seed)
+	view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+	sim = simulation.Simulation(level.Level(view_rect, LEVEL_LENGTH, seed=seed), view_rect, **options)
+	states = []
+	while len(states) < frames and not sim.is_over():
+		sim.control(pilot(sim))
+		sim.update(TICK)
+		states.append(simulation.get_state(sim))
+	return states
+
+class FormationTest(unittest.TestCase):
+
+	def test_clipped_pendulum_reverses(self):
+		""" Pendulum range wider than formation x range: formation bounces off the end of x range instead of sticking to it. """
+		x_range = (32, 336)
+		formation = controller.Formation(controller.ShootTemper(0.0, 0), controller.PendulumMoveTemper((100, 700)), (300.0, 0.0), x_range)
+		xs = []
+		for i in xrange(1200):
+			formation.update_tempers(TICK)
+			formation.apply_tempers(TICK)
+			xs.append(formation.pos[0])
+		right = xs.index(max(xs))
+		self.assertAlmostEqual(max(xs), x_range[1])
+		self.assertLess(xs[-1], x_range[1])
+		self.assertLess(min(xs[right:]), 150)
+		self.assertTrue(all(x_range[0] <= x <= x_range[1] for x in xs))
+
+	def test_members_out_of_play_are_dropped(self):
+		""" Ships killed or gone out of view no longer drive the formation. """
+		formation = controller.Formation(controller.ShootTemper(0.0, 0), controller.PawnMoveTemper(), (100.0, 0.0), (0, SCREEN_SIZE[0]))
+		ships = [objects.EnemyShip(None, (100.0 + ENEMY_DISTANCE * i, 0.0), ENEMY_SIZE, formation, ENEMY_RELOAD_TIME) for i in xrange(3)]
+		for ship in ships:
+			formation.release(ship)
+		self.assertTrue(formation.prepare(set(ships)))
+		self.assertEqual(formation.members, ships)
+		self.assertTrue(formation.prepare(set(ships[1:2])))
+		self.assertEqual(formation.members, ships[1:2])
+		self.assertFalse(formation.prepare(set()))
+
+	def test_set_x_shifts_last_position(self):
+		""" Ships put to a new x keep their motion of the last tick, so they are not drawn or swept across the jump. """
+		formation = controller.Formation(controller.ShootTemper(0.0, 0), controller.PawnMoveTemper(), (100.0, 0.0), (0, SCREEN_SIZE[0]))
+		ship = objects.EnemyShip(None, (140.0, 0.0), ENEMY_SIZE, formation, ENEMY_RELOAD_TIME)
+		formation.release(ship)
+		ship.last_pos = (139.0, -1.0)
+		formation.set_x(150.0)
+		self.assertEqual(ship.pos, (190.0, 0.0))
+		self.assertEqual(ship.last_pos, (189.0, -1.0))
+
+		ai = controller.EnemyController(controller.ShootTemper(0.0, 0), controller.PawnMoveTemper())
+		ship = objects.EnemyShip(None, (140.0, 10.0), ENEMY_SIZE, ai, ENEMY_RELOAD_TIME)
+		ship.last_pos = (141.0, 9.0)
+		ai.set_x(100.0)
+		self.assertEqual(ship.pos, (100.0, 10.0))
+		self.assertEqual(ship.last_pos, (101.0, 9.0))
+
+class StreamTest(unittest.TestCase):
+
+	def test_lazy_level_has_all_groups(self):
+		""" Finite stream yields as many formations as a level generated at once. """
+		view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+		for seed in xrange(3):
+			for group_count in [1, 7, ENEMY_GROUP_COUNT]:
+				player = objects.PlayerShip(None, view_rect.center, PLAYER_SIZE, controller.PlayerController(), PLAYER_RELOAD_TIME, PLAYER_HEALTH)
+				stream = level.stream_groups(view_rect, player, random.Random(seed), LEVEL_LENGTH, group_count)
+				formations = set(enemy.controller for depth, enemies in stream for enemy in enemies)
+				self.assertEqual(len(formations), group_count)
+
+class SpriteCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.cache_dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.cache_dir)
+
+	def test_cached_sprites_are_generated_ones(self):
+		""" Sprites written to the cache on the first load are read back on the next one with the same pixels. """
+		generated = sprites.load_sprites(self.cache_dir)
+		self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+		cached = sprites.load_sprites(self.cache_dir)
+		self.assertEqual(sorted(cached), sorted(generated))
+		for name in generated:
+			self.assertEqual(pygame.image.tostring(cached[name], "RGB"), pygame.image.tostring(generated[name], "RGB"))
+			self.assertEqual(cached[name].get_colorkey(), generated[name].get_colorkey())
+
+	def test_broken_cache_is_regenerated(self):
+		sprites.load_sprites(self.cache_dir)
+		for name in os.listdir(self.cache_dir):
+			with open(os.path.join(self.cache_dir, name), "w") as f:
+				f.write("broken")
+		self.assertEqual(sorted(sprites.load_sprites(self.cache_dir)), sorted(sprites.SPRITES))
+
+class PoolTest(unittest.TestCase):
+
+	def test_released_object_is_reused(self):
+		bullet_pool = pool.ObjectPool(objects.PlayerBullet)
+		bullet = bullet_pool.acquire(None, (10.0, 20.0), BULLET_SIZE, PLAYER_BULLET_VELOCITY)
+		self.assertEqual((bullet_pool.hits, bullet_pool.misses), (0, 1))
+		bullet.exists = False
+		bullet.move((5.0, 5.0))
+		bullet.get_box()
+		bullet_pool.release(bullet)
+
+		reused = bullet_pool.acquire(None, (100.0, 200.0), BULLET_SIZE, PLAYER_AUX_LEFT_BULLET_VELOCITY)
+		self.assertTrue(reused is bullet)
+		self.assertEqual((bullet_pool.hits, bullet_pool.misses), (1, 1))
+		# Reused object is the same as a new one.
+		self.assertTrue(reused.is_alive())
+		self.assertEqual((reused.pos, reused.last_pos, reused.velocity), ((100.0, 200.0), (100.0, 200.0), PLAYER_AUX_LEFT_BULLET_VELOCITY))
+		self.assertEqual(reused.get_rect(), objects.PlayerBullet(None, (100.0, 200.0), BULLET_SIZE, PLAYER_AUX_LEFT_BULLET_VELOCITY).get_rect())
+		self.assertTrue(bullet_pool.acquire(None, (0.0, 0.0), BULLET_SIZE, PLAYER_BULLET_VELOCITY) is not bullet)
+
+	def test_only_pooled_classes_are_released(self):
+		ship = new_enemy((0.0, 0.0))
+		objects.release(ship)
+		self.assertFalse(any(ship in objects_pool.free for objects_pool in objects.POOLS.values()))
+
+	def test_objects_in_play_are_never_released(self):
+		""" Every gone object is released once, and none of them is still in play. """
+		for options in [{}, {"use_arrays": True}] if arrays.is_available() else [{}]:
+			random.seed(3)
+			view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+			sim = simulation.Simulation(level.Level(view_rect, LEVEL_LENGTH, seed=3), view_rect, **options)
+			simulation.run_headless(sim, TICK, 1500, simulation.hunter_pilot)
+			free = [o for objects_pool in objects.POOLS.values() for o in objects_pool.free]
+			self.assertEqual(len(set(map(id, free))), len(free))
+			self.assertFalse(set(map(id, free)) & set(map(id, sim.get_objects())))
+			self.assertTrue(sum(objects_pool.hits for objects_pool in objects.POOLS.values()))
+
+class ReplayTest(unittest.TestCase):
+
+	def play(self, sim, frames):
+		""" Plays _frames_ of (sec, pressed keys) on _sim_. Returns list of states after every tick. """
+		states = []
+		for sec, pressed_keys in frames:
+			sim.control(pressed_keys)
+			sim.update(sec)
+			states.append(simulation.get_state(sim))
+		return states
+
+	def test_replay_repeats_the_game(self):
+		""" Recorded game replayed from the stream goes through exactly the same states. """
+		view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+		for seed, lazy, endless in [(5, False, False), (6, True, False), (7, False, True)]:
+			stream = io.BytesIO()
+			recorder = replay.Recorder(stream, seed, lazy, endless)
+			sim = simulation.Simulation(replay.create_level(view_rect, seed, lazy, endless), view_rect)
+			rng = random.Random(seed)
+			states = []
+			for tick in xrange(1200):
+				# Frame times vary as they do in the game when frames are slow.
+				sec, pressed_keys = rng.choice([TICK, TICK * 2]), simulation.hunter_pilot(sim)
+				recorder.record(sec, pressed_keys)
+				states.extend(self.play(sim, [(sec, pressed_keys)]))
+			self.assertEqual(recorder.frames, 1200)
+
+			# Whatever happened to global random since then.
+			random.seed(seed + 1)
+			game_replay = replay.Replay(io.BytesIO(stream.getvalue()))
+			self.assertEqual((game_replay.seed, game_replay.lazy, game_replay.endless), (seed, lazy, endless))
+			sim = simulation.Simulation(game_replay.create_level(view_rect), view_rect)
+			self.assertEqual(self.play(sim, game_replay.frames), states)
+
+	def test_broken_replay_is_rejected(self):
+		self.assertRaises(ValueError, replay.Replay, io.BytesIO(b"DSKY"))
+		self.assertRaises(ValueError, replay.Replay, io.BytesIO(b"X" * replay.HEADER.size))
+
+class BoxTest(unittest.TestCase):
+
+	def test_box_is_the_rect(self):
+		""" Box has the same edges as the Rect of an object built right from its position, wherever it is. """
+		rng = random.Random(0)
+		for i in xrange(1000):
+			pos, radius = (rng.uniform(-50, 50), rng.uniform(-50, 50)), rng.choice([BULLET_SIZE, ENEMY_SIZE, 7.5])
+			o = objects.Object(None, pos, radius)
+			rect = pygame.Rect(int(pos[0] - radius), int(pos[1] - radius), int(radius * 2), int(radius * 2))
+			self.assertEqual(o.get_box(), (rect.left, rect.top, rect.right, rect.bottom))
+			self.assertEqual(o.get_rect(), rect)
+
+	def test_box_follows_position(self):
+		o = objects.Object(None, (10.0, 10.0), 5)
+		self.assertEqual(o.get_box(), (5, 5, 15, 15))
+		o.move((20.0, 0.0))
+		self.assertEqual(o.get_box(), (25, 5, 35, 15))
+		o.pos = (0.0, 100.0)
+		self.assertEqual(o.get_box(), (-5, 95, 5, 105))
+
+	def test_culling_is_the_rect_test(self):
+		""" Objects are kept exactly when their rects touch the view, enemies gone past the bottom border are leaked. """
+		view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+		sim = simulation.Simulation(level.Level(view_rect, LEVEL_LENGTH, lazy=True, seed=0), view_rect)
+		rng = random.Random(1)
+		for i in xrange(1000):
+			pos = (rng.uniform(-20, view_rect.right + 20), rng.uniform(-20, view_rect.bottom + 20))
+			o = rng.choice([new_enemy(pos), objects.PlayerBullet(None, pos, BULLET_SIZE, PLAYER_BULLET_VELOCITY)])
+			kept, dead, gone = [], [], []
+			leaked = sim.sort_out(o, kept, dead, gone)
+			self.assertEqual(kept == [o], view_rect.colliderect(o.get_rect()))
+			self.assertEqual(gone == [o], not kept)
+			self.assertEqual(leaked, int(isinstance(o, objects.EnemyShip) and o.get_rect().bottom > view_rect.bottom))
+
+class CollisionTest(unittest.TestCase):
+
+	def test_grid_finds_the_same_as_all_pairs(self):
+		""" Spatial hash finds the same collidees in the same order as the test of all pairs, swept ones included. """
+		table = collision.CollisionTable(objects.LEVEL_CLASSES)
+		for seed in xrange(5):
+			objs = random_objects(random.Random(seed), 400)
+			collidees = collision.find_collisions(objs, table)
+			self.assertEqual(collidees, collision.find_collisions_all_pairs(objs))
+			self.assertTrue(any(collidees))
+
+	def test_bounds_cover_the_whole_tick(self):
+		bullet = objects.PlayerBullet(None, (100.0, 50.0), BULLET_SIZE, PLAYER_BULLET_VELOCITY)
+		bullet.last_pos = (130.0, 90.0)
+		x, y, radius = collision.get_bounds(bullet)
+		self.assertEqual((x, y, radius), (115.0, 70.0, BULLET_SIZE + 25.0))
+
+	def test_bullet_can_not_jump_over_ship(self):
+		""" Bullet which has been on both sides of a ship within a tick hits it, though it overlaps the ship at no end of the tick. """
+		ship = new_enemy((100.0, 100.0))
+		bullet = objects.PlayerBullet(None, (100.0, 50.0), BULLET_SIZE, PLAYER_BULLET_VELOCITY)
+		bullet.last_pos = (100.0, 150.0)
+		self.assertFalse(objects_colliding(ship, bullet))
+		self.assertTrue(objects_swept_colliding(ship, bullet))
+		self.assertTrue(objects_swept_colliding(bullet, ship))
+		table = collision.CollisionTable(objects.LEVEL_CLASSES)
+		self.assertEqual(collision.find_collisions([ship, bullet], table), [[bullet], [ship]])
+		# Bullet which has passed by doesn't hit.
+		bullet.pos, bullet.last_pos = (200.0, 50.0), (200.0, 150.0)
+		self.assertEqual(collision.find_collisions([ship, bullet], table), [[], []])
+
+	def test_table_follows_declared_reactions(self):
+		table = collision.CollisionTable(objects.LEVEL_CLASSES)
+		self.assertEqual(table[objects.EnemyShip, objects.PlayerBullet], (True, True, objects_swept_colliding))
+		self.assertEqual(table[objects.PlayerShip, objects.HealthBonus], (True, True, objects_colliding))
+		self.assertEqual(table[objects.Explode, objects.HealthBonus], None)
+		self.assertEqual(table[objects.PlayerBullet, objects.EnemyBullet], None)
+		self.assertEqual(table[objects.PlayerBullet, objects.PlayerShip], None)
+
+		class LaserBullet(objects.PlayerBullet):
+			__slots__ = ()
+		# Classes not known to the table are added on demand.
+		self.assertEqual(table[objects.EnemyShip, LaserBullet], (True, True, objects_swept_colliding))
+		self.assertTrue((objects.EnemyShip, LaserBullet) in table)
+
+	def test_player_effects_follow_subclasses(self):
+		""" Collidee of a subclass passed by the table has the effect of its base class, effects go in their own order. """
+		class HomingBullet(objects.EnemyBullet):
+			__slots__ = ()
+		player = objects.PlayerShip(None, (100.0, 100.0), PLAYER_SIZE, controller.PlayerController(), PLAYER_RELOAD_TIME, PLAYER_HEALTH)
+		bullet = HomingBullet(None, (100.0, 100.0), BULLET_SIZE, ENEMY_BULLET_VELOCITY)
+		table = collision.CollisionTable(objects.LEVEL_CLASSES)
+		self.assertEqual(collision.find_collisions([player, bullet], table), [[bullet], [player]])
+		player.collide([bullet])
+		self.assertEqual(player.health, PLAYER_HEALTH - COLLISION_DAMAGE)
+		# Heal is applied after damage, though the bonus comes first: otherwise health would be clipped before the damage.
+		player.collide([objects.HealthBonus(None, (100.0, 100.0), BONUS_SIZE), bullet])
+		self.assertEqual(player.health, PLAYER_HEALTH)
+
+class SimulationTest(unittest.TestCase):
+
+	def test_last_pos_is_position_before_tick(self):
+		""" Objects kept from the previous tick remember their position before it, created ones haven't moved yet. """
+		random.seed(3)
+		view_rect = pygame.Rect((0, 0), SCREEN_SIZE)
+		sim = simulation.Simulation(level.Level(view_rect, LEVEL_LENGTH, seed=3), view_rect)
+		moved = 0
+		for i in xrange(300):
+			before = dict((id(o), o.pos) for o in sim.level.objects)
+			sim.control(simulation.hunter_pilot(sim))
+			sim.update(TICK)
+			for o in sim.level.objects:
+				self.assertEqual(o.last_pos, before.get(id(o), o.pos))
+				moved += o.last_pos != o.pos
+		self.assertTrue(moved)
+
+class PainterTest(unittest.TestCase):
+
+	def setUp(self):
+		self.screen = painter.init_display(dummy=True)
+		# Pushes to display are recorded instead: None for the whole screen, list of rects otherwise.
+		self.pushed = []
+		self.display_update, self.display_flip = pygame.display.update, pygame.display.flip
+		pygame.display.update = lambda rects: self.pushed.append([pygame.Rect(rect) for rect in rects])
+		pygame.display.flip = lambda: self.pushed.append(None)
+
+	def tearDown(self):
+		pygame.display.update, pygame.display.flip = self.display_update, self.display_flip
+
+	def colors(self, rect):
+		return set(self.screen.get_at((x, y))[:3] for x in xrange(rect.left, rect.right) for y in xrange(rect.top, rect.bottom))
+
+	def draw_frame(self, frame_painter, background, objs):
+		frame_painter.draw_background(self.screen, background)
+		for o in objs:
+			frame_painter.draw_object(self.screen, o)
+		frame_painter.present(self.screen)
+
+	def test_dirty_rects_push_previous_and_current_frame(self):
+		""" Only rects drawn in the last two frames are pushed, and rects of the previous frame are erased. """
+		frame_painter = painter.Painter()
+		background = level.Background(SCREEN_SIZE, 0)
+		ship = objects.Object(sprites.ENEMY_SPRITE, (100.0, 100.0), ENEMY_SIZE)
+		self.draw_frame(frame_painter, background, [ship])
+		first_rect = ship.get_rect()
+		ship.pos = (300.0, 400.0)
+		self.draw_frame(frame_painter, background, [ship])
+		self.assertEqual(self.pushed, [[first_rect], [first_rect, ship.get_rect()]])
+		self.assertNotEqual(self.colors(ship.get_rect()), set([BACK_COLOR]))
+		self.assertEqual(self.colors(first_rect), set([BACK_COLOR]))
+		self.assertEqual(frame_painter.pixels_per_frame(), first_rect.width * first_rect.height * 3 / 2)
+
+	def test_draw_object_interpolates_position(self):
+		""" Object is drawn at its position before the tick with alpha 0, after it with 1 and in between otherwise. """
+		frame_painter = painter.Painter()
+		ship = objects.Object(sprites.ENEMY_SPRITE, (140.0, 60.0), ENEMY_SIZE)
+		ship.last_pos = (100.0, 100.0)
+		for alpha, center in [(0.0, (100, 100)), (0.5, (120, 80)), (1.0, (140, 60))]:
+			frame_painter.draw_object(self.screen, ship, alpha)
+			self.assertEqual(frame_painter.drawn_rects[-1], sprites.ENEMY_SPRITE.get_rect(center=center))
+
+	def test_healthbar_follows_interpolated_player(self):
+		""" Health bar is drawn under the player where it is drawn, not where it is after the tick. """
+		frame_painter = painter.Painter()
+		player = objects.PlayerShip(sprites.PLAYER_SPRITE, (400.0, 300.0), PLAYER_SIZE, controller.PlayerController(), PLAYER_RELOAD_TIME, PLAYER_HEALTH)
+		player.last_pos = (360.0, 320.0)
+		player.health = PLAYER_HEALTH / 2
+		for alpha in [0.0, 0.5, 1.0]:
+			frame_painter.draw_object(self.screen, player, alpha)
+			ship_rect, bar_rect = frame_painter.drawn_rects[-2:]
+			self.assertEqual(bar_rect.centerx, ship_rect.centerx)
+			self.assertTrue(ship_rect.bottom <= bar_rect.top < ship_rect.bottom + PLAYER_SIZE)
+
+	def test_display_format_sprites_keep_pixels(self):
+		""" Sprites converted to display format are converted once and show the same pixels. """
+		cache = variants.VariantCache(sprites.SPRITES)
+		for name in ["player", "enemy", "digit_True"]:
+			sprite = cache.get(name)
+			self.assertTrue(cache.get(name) is sprite)
+			self.assertEqual(sprite.get_bitsize(), self.screen.get_bitsize())
+			source = sprites.SPRITES[name]
+			for x in xrange(source.get_width()):
+				for y in xrange(source.get_height()):
+					self.assertEqual(sprite.get_at((x, y)), source.get_at((x, y)))
+
+	def test_full_frames_are_flipped(self):
+		""" Full redraw and backgrounds covering the whole screen push the whole screen. """
+		ship = objects.Object(sprites.ENEMY_SPRITE, (100.0, 100.0), ENEMY_SIZE)
+		self.draw_frame(painter.Painter(dirty_rects=False), level.Background(SCREEN_SIZE, 10), [ship])
+		self.draw_frame(painter.Painter(), starfield.Starfield(SCREEN_SIZE, 10, 2), [ship])
+		self.assertEqual(self.pushed, [None, None])
+
+@unittest.skipUnless(arrays.is_available(), "requires NumPy")
+class ProjectileStoreTest(unittest.TestCase):
+
+	def test_stored_bullets_play_the_same_game(self):
+		""" Bullets collided, moved and culled in arrays give the same state after every tick as bullet objects. """
+		for seed in [1, 2]:
+			for pilot in [simulation.gunner_pilot, simulation.hunter_pilot]:
+				self.assertEqual(play_states(seed, pilot, 1200), play_states(seed, pilot, 1200, use_arrays=True))
+
+	def test_collide_sweeps_bullets(self):
+		""" Bullet which jumps over a ship within a tick hits it, as in collision.find_collisions. """
+		ship = new_enemy((100.0, 100.0))
+		missed = objects.PlayerBullet(None, (200.0, 50.0), BULLET_SIZE, PLAYER_BULLET_VELOCITY)
+		jumped = objects.PlayerBullet(None, (100.0, 50.0), BULLET_SIZE, PLAYER_BULLET_VELOCITY)
+		for bullet in [missed, jumped]:
+			bullet.last_pos = (bullet.pos[0], 150.0)
+		table = collision.CollisionTable(objects.LEVEL_CLASSES)
+		store = arrays.ProjectileStore()
+		store.add([missed, jumped])
+		collidees = [[]]
+		store.collide([ship], collidees, table)
+		self.assertEqual(collidees, [[jumped]])
+		self.assertEqual(store.alive[:store.count].tolist(), [True, False])
+		self.assertEqual(collision.find_collisions([ship, missed, jumped], table), [[jumped], [], [ship]])
+
+	def test_cull_drops_dead_and_gone_bullets(self):
+		""" Culled bullets are returned to be released, the rest are written back on sync. """
+		store = arrays.ProjectileStore(capacity=2)
+		bullets = [objects.EnemyBullet(None, pos, BULLET_SIZE, (0.0, -600.0)) for pos in [(100.0, 10.0), (200.0, 10.0), (300.0, -50.0)]]
+		store.add(bullets)
+		store.alive[1] = False
+		store.move(TICK)
+		self.assertEqual(store.cull((0, 0) + SCREEN_SIZE), bullets[1:])
+		self.assertEqual(store.sync(), bullets[:1])
+		self.assertEqual(bullets[0].last_pos, (100.0, 10.0))
+		self.assertEqual(bullets[0].pos, (100.0, 0.0))
+
+@unittest.skipUnless(arrays.is_available(), "requires NumPy")
+class BatchAITest(unittest.TestCase):
+
+	def test_batched_ai_plays_the_same_game(self):
+		""" Per-object and batched AI give the same state after every tick, whoever plays and whatever the level is. """
+		for seed in [1, 2, 3]:
+			for pilot in ["idle", "gunner", "hunter"]:
+				self.assertIsNone(simulation.check_batch_ai(seed, TICK, 1200, simulation.PILOTS[pilot]), "seed %d, %s pilot" % (seed, pilot))
+		self.assertIsNone(simulation.check_batch_ai(4, TICK, 1200, simulation.hunter_pilot, lazy=True, endless=True))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,65 @@
+# text.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Cached fonts and rendered text, HUD counters drawn from pre-rendered glyphs.
+
+import collections
+
+import pygame
+
+from defs import *
+
+HUD_GLYPHS = "0123456789.-"
+
+class TextCache:
+	""" Keeps loaded fonts and rendered text surfaces keyed by (font, size, text, color).
+	Least recently used surfaces are evicted when there are more than _max_size_ of them. """
+
+	def __init__(self, max_size=TEXT_CACHE_SIZE):
+		self.max_size = max_size
+		self.fonts = {}
+		self.surfaces = collections.OrderedDict()
+
+	def get_font(self, name, size):
+		""" Returns font by file _name_ (None for default font) and _size_, loads it only once. """
+		key = (name, size)
+		if key not in self.fonts:
+			self.fonts[key] = pygame.font.Font(name, size)
+		return self.fonts[key]
+
+	def render(self, text, size=FONT_SIZE, color=TEXT_COLOR, name=None):
+		""" Returns surface with rendered _text_. """
+		key = (name, size, text, color)
+		surface = self.surfaces.pop(key, None)
+		if surface is None:
+			surface = self.get_font(name, size).render(text, True, color)
+			if pygame.display.get_surface():
+				surface = surface.convert_alpha()
+			if len(self.surfaces) >= self.max_size:
+				self.surfaces.popitem(last=False)
+		self.surfaces[key] = surface
+		return surface
+
+class Hud:
+	""" Draws counters like score or FPS: constant caption and frequently changing number.
+	Numbers are composed from pre-rendered glyphs instead of rendering whole strings every frame. """
+
+	def __init__(self, text_cache, size=HUD_FONT_SIZE, color=TEXT_COLOR):
+		self.text_cache = text_cache
+		self.size = size
+		self.color = color
+		self.glyphs = dict((glyph, text_cache.render(glyph, size, color)) for glyph in HUD_GLYPHS)
+
+	def draw_counter(self, screen, pos, caption, value):
+		""" Draws "_caption_ _value_" at _pos_ (top left corner).
+		Returns list of rects drawn. """
+		x, y = pos
+		caption_sprite = self.text_cache.render(caption + " ", self.size, self.color)
+		rects = [screen.blit(caption_sprite, (x, y))]
+		x += caption_sprite.get_width()
+		for glyph in str(value):
+			glyph_sprite = self.glyphs[glyph]
+			rects.append(screen.blit(glyph_sprite, (x, y)))
+			x += glyph_sprite.get_width()
+		return rects
@@ -0,0 +1,31 @@
+# variants.py
+# author antifin 2011
+# license WTFPLv2
+#
+# Cache of sprites in display format.
+
+import pygame
+
+COLORKEY = (255, 0, 255)
+
+class VariantCache:
+	""" Serves named sprites as RLE-accelerated copies converted to display format,
+	so blits don't need any pixel format conversion. Requires display mode to be set. """
+
+	def __init__(self, named_sprites):
+		""" _named_sprites_ is a dict: name -> surface. """
+		self.sprites = named_sprites
+		self.variants = {}
+
+	def get(self, name):
+		""" Returns sprite with _name_ in display format, which is converted on the first call. """
+		if name not in self.variants:
+			# Transparent pixels of any kind become colorkey.
+			source = self.sprites[name]
+			sprite = pygame.Surface(source.get_size())
+			sprite.fill(COLORKEY)
+			sprite.blit(source, (0, 0))
+			sprite = sprite.convert()
+			sprite.set_colorkey(COLORKEY, pygame.RLEACCEL)
+			self.variants[name] = sprite
+		return self.variants[name]